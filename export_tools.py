@@ -0,0 +1,156 @@
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Export av tabeller till redaktionsmaterial. Arbetsböckerna skrivs
+# med openpyxl i write-only-läge, dvs rad för rad direkt till filen i
+# stället för att hela arbetsboken byggs upp i minnet först.
+
+def excel_rows(df, index=False):
+    """Återger tabellen rad för rad som listor med vanliga \
+python-värden, med kolumnnamnen först. Saknade värden blir tomma \
+celler, kategorier blir text och float32 skrivs med sin kortaste \
+decimalform, så att t.ex. 22,6 inte skrivs som 22,600000381."""
+    if index:
+        df = df.reset_index()
+
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == 'float32':
+            # str() på en float32 ger det kortaste talet som avrundas
+            # till samma float32, t.ex. '22.6'
+            series = pd.Series([float(str(value)) for value in series.to_numpy()],
+                               index=series.index, dtype='float64')
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(object)
+        columns.append(series.astype(object)\
+                             .where(series.notna(), None)\
+                             .tolist())
+
+    yield [str(col) for col in df.columns]
+    for row in zip(*columns):
+        yield [value.item() if isinstance(value, np.generic) else value \
+               for value in row]
+
+
+def write_workbook(path, sheets, index=False):
+    """Skriver en arbetsbok med en eller flera flikar.
+
+PARAMETRAR
+----------
+path : sökväg till xlsx-filen. Mappen skapas om den saknas
+sheets : dataframe, eller dict med fliknamn -> dataframe
+index : True skriver också ut index"""
+    path = Path(path)
+    if isinstance(sheets, pd.DataFrame):
+        sheets = {'Sheet1':sheets}
+
+    if not os.path.isdir(path.parent):
+        os.makedirs(path.parent)
+
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        # excel tillåter högst 31 tecken i ett fliknamn
+        ws = wb.create_sheet(title=str(name)[:31])
+        for row in excel_rows(df, index):
+            ws.append(row)
+    wb.save(path)
+    return path
+
+
+def zip_bundle(folder, target=None):
+    """Packar alla filer i 'folder' i en zip-fil, default \
+{folder}.zip bredvid mappen."""
+    folder = Path(folder)
+    target = Path(target) if target else folder.with_suffix('.zip')
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(folder.rglob('*')):
+            if path.is_file():
+                zf.write(path, path.relative_to(folder.parent))
+    return target
+
+
+class ExcelExporter:
+    """Skriver tabeller till redaktionsmaterial i bakgrunden medan \
+beräkningarna fortsätter.
+
+    with ExcelExporter() as export:
+        export.add(df, 'redaktionsmaterial/valdata/.../tabell.xlsx')
+        export.add(df_2014, 'redaktionsmaterial/.../år.xlsx', sheet='2014')
+        export.add(df_2018, 'redaktionsmaterial/.../år.xlsx', sheet='2018')
+
+Tabeller utan fliknamn skrivs direkt i en egen arbetsbok. Tabeller \
+med fliknamn samlas per fil och skrivs som en arbetsbok med flera \
+flikar när exporten stängs. 'index' gäller varje flik för sig. Varje \
+tabell kopieras när den läggs till, så den kan ändras efteråt utan \
+att exporten påverkas. Avbryts with-blocket av ett fel skrivs inga \
+samlade arbetsböcker och inga zip-filer.
+
+PARAMETRAR
+----------
+workers : antal trådar som skriver filer
+bundle : mapp vars undermappar (en per reporter) packas i var sin \
+zip-fil när exporten stängs, t.ex. 'redaktionsmaterial/valdata'. \
+Default ingen packning"""
+
+    def __init__(self, workers=2, bundle=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.bundle = bundle
+        self.futures = []
+        self.sheets = {}
+
+    def add(self, df, path, sheet=None, index=False):
+        """Lägger till en tabell för export."""
+        df = df.copy()
+        if sheet is None:
+            self.futures.append(self.executor.submit(write_workbook,
+                                                     path, df, index))
+            return
+
+        # index skrivs in som kolumner redan här, så att varje flik
+        # kan ha sitt eget index-val
+        if index:
+            df = df.reset_index()
+        self.sheets.setdefault(str(path), {})[sheet] = df
+
+    def close(self):
+        """Skriver de samlade arbetsböckerna, väntar in alla filer \
+och packar ev zip-filer. Återger sökvägarna till allt som skrivits."""
+        for path, sheets in self.sheets.items():
+            self.futures.append(self.executor.submit(write_workbook,
+                                                     path, sheets))
+        self.sheets = {}
+
+        # result() väcker ev fel från trådarna här
+        written = [future.result() for future in self.futures]
+        self.futures = []
+        self.executor.shutdown()
+
+        if self.bundle is not None:
+            written += [zip_bundle(folder) for folder \
+                        in sorted(Path(self.bundle).iterdir()) \
+                        if folder.is_dir()]
+        return written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+            return
+
+        # ett fel i with-blocket: inga halvfärdiga arbetsböcker eller
+        # zip-filer skrivs, och felet från blocket skickas vidare
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown()
+        self.futures = []
+        self.sheets = {}
@@ -3,9 +3,16 @@ import os
 import shutil
 import zipfile
 import io
-import requests
+import json
+import hashlib
+import re
+import time
+import warnings
+import numpy as np
 import xml.etree.ElementTree as ET
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from export_tools import write_workbook
 
 def folder_maker(years=['2010','2014','2018']):
     """Följande funktion skapar ett träd med mappar \
@@ -223,7 +230,10 @@ NICKLAS_datawrapper")
 
 def xml_data_fetcher(count_type="prelresultat",years=['2010',
                                                       '2014',
-                                                      '2018']):
+                                                      '2018'],
+                     base_url="https://data.val.se/val",
+                     workers=3,
+                     extract=True):
     """Den här funktionen hämtar xml-filer med valdata \
 för 2010, 2014 och 2018. De två första valen så är \
 xml-datat från sluträkningen respektive år. I skrivande \
@@ -241,35 +251,716 @@ count_type : vilken data som ska hämtas för valresultatet \
 years : vilka år man ska hämta ifrån. Koden är byggd \
 för att hämta från åren 2010-2018, så detta är default. 
 
-"""
-    
-    
+base_url : adressen som zip-filerna hämtas ifrån. Kan pekas \
+om till en lokal server vid test.
 
-    for year in years:
+workers : hur många år som hämtas samtidigt.
 
-        if os.path.isdir(f'data/xml_filer/val_{year}'):
-            shutil.rmtree(f'data/xml_filer/val_{year}')
-
-        if not os.path.isdir(f'data/xml_filer/val_{year}'):
-            os.makedirs(f'data/xml_filer/val_{year}')
+extract : om False sparas bara zip-filen (data/xml_filer/val_{år}.zip) \
+och packas inte upp. ExtractData läser då xml-filerna direkt ur den.
 
+Se download_archives() för hur nedladdningen går till. Återger \
+en dictionary med True för de år vars data har ändrats.
+"""
+    return download_archives(count_type=count_type,
+                             years=years,
+                             base_url=base_url,
+                             workers=workers,
+                             extract=extract)
+
+
+def archive_url(year, count_type="prelresultat",
+                base_url="https://data.val.se/val"):
+    """Adressen till zip-filen med ett års valdata."""
+    if year == '2018':
+        return f"{base_url}/val{year}/{count_type}/{count_type}.zip"
+    return f"{base_url}/val{year}/slutresultat/slutresultat.zip"
+
+
+def download_archives(count_type="prelresultat",
+                      years=['2010','2014','2018'],
+                      base_url="https://data.val.se/val",
+                      workers=3,
+                      state_path='data/xml_filer/nedladdningar.json',
+                      extract=True):
+    """Hämtar zip-filerna för flera år samtidigt (i 'workers' \
+trådar) och packar upp dem till data/xml_filer/val_{år}.
+
+- Varje fil strömmas direkt till disk i stället för att läsas in \
+i minnet.
+- ETag och Last-Modified från förra hämtningen skickas med som \
+If-None-Match/If-Modified-Since, så en oförändrad fil laddas inte \
+ned igen (svar 304).
+- Om servern ändå skickar filen jämförs dess sha256-summa med \
+förra hämtningens. Är den samma packas den inte upp igen.
+- En ny fil packas upp i en egen versionsmapp, och val_{år} är en \
+symbolisk länk som pekas om till den nya mappen med ett enda \
+os.replace(). Den som läser mappen ser alltså aldrig ett halvt \
+raderat eller halvt uppackat träd (se swap_directory()). Med \
+extract=False behålls bara zip-filen, som ExtractData då läser direkt.
+
+Uppgifterna om förra hämtningen sparas i 'state_path'. Återger en \
+dictionary {år: True/False} där True betyder att årets data har \
+ändrats."""
+    if os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+    else:
+        state = {}
 
-        if year == '2018':
-            url = f"https://data.val.se/val/\
-val2018/{count_type}/{count_type}.zip"
+    if not os.path.isdir('data/xml_filer'):
+        os.makedirs('data/xml_filer')
+
+    changed = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_download_archive,
+                                   year,
+                                   archive_url(year, count_type, base_url),
+                                   state.get(year, {}),
+                                   extract) \
+                   for year in years]
+        for year, future in zip(years, futures):
+            changed[year], state[year] = future.result()
+
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+
+    return changed
+
+
+def _download_archive(year, url, previous, extract=True):
+    """Hämtar och packar upp ett års zip-fil. Används av \
+download_archives(). Återger (ändrad, ny_status)."""
+    target = f'data/xml_filer/val_{year}'
+    archive = f'data/xml_filer/val_{year}.zip'
+    have_data = os.path.exists(archive) and \
+        (not extract or (os.path.isdir(target) and len(os.listdir(target)) > 0))
+
+    headers = {}
+    if have_data and previous.get('url') == url:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+
+    # requests importeras först här så att util (som importerar
+    # den här modulen) inte behöver ladda den
+    import requests
+
+    with requests.get(url, headers=headers, stream=True,
+                      timeout=60) as response:
+        if response.status_code == 304:
+            return False, previous
+        response.raise_for_status()
+
+        h = hashlib.sha256()
+        with open(archive + '.part', 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                h.update(chunk)
+                f.write(chunk)
+
+        status = {'url':url,
+                  'etag':response.headers.get('ETag'),
+                  'last_modified':response.headers.get('Last-Modified'),
+                  'sha256':h.hexdigest()}
+
+    if have_data and previous.get('sha256') == status['sha256']:
+        os.remove(archive + '.part')
+        return False, status
+
+    os.replace(archive + '.part', archive)
+
+    if not extract:
+        return True, status
+
+    # packa upp i en ny versionsmapp och peka sedan om val_{år}
+    version = f'data/xml_filer/.val_{year}.{time.time_ns()}'
+    with zipfile.ZipFile(archive) as file:
+        file.extractall(version)
+    swap_directory(target, version)
+
+    return True, status
+
+
+def swap_directory(target, version):
+    """Låter 'target' peka på mappen 'version'. 'target' är en \
+symbolisk länk som byts ut med ett enda os.replace(), så att den \
+som läser 'target' antingen ser den gamla eller den nya mappen. \
+Den gamla versionsmappen tas bort efteråt.
+
+Är 'target' en vanlig mapp (från en äldre uppackning) flyttas den \
+först undan. Går det inte att skapa symboliska länkar (t.ex. i \
+Windows utan utvecklarläge) byter mapparna plats med två \
+os.replace(), och då saknas 'target' en kort stund mellan dem."""
+    parent = os.path.dirname(target)
+    old = os.path.join(parent, os.readlink(target)) \
+        if os.path.islink(target) else None
+
+    link = target + '.länk'
+    if os.path.lexists(link):
+        os.remove(link)
+    try:
+        os.symlink(os.path.basename(version), link)
+    except OSError:
+        old = target + '.gammal'
+        if os.path.isdir(old):
+            shutil.rmtree(old)
+        if os.path.isdir(target):
+            os.replace(target, old)
+        os.replace(version, target)
+    else:
+        if os.path.isdir(target) and not os.path.islink(target):
+            old = target + '.gammal'
+            if os.path.isdir(old):
+                shutil.rmtree(old)
+            os.replace(target, old)
+        os.replace(link, target)
+
+    if old is not None and os.path.isdir(old):
+        shutil.rmtree(old)
+
+
+def archive_members(path):
+    """Återger {filnamn: crc32} för alla filer i en zip-fil, eller \
+en tom dictionary om filen inte finns. Crc-summorna ligger redan \
+i zip-filens innehållsförteckning, så inga filer behöver packas upp."""
+    if not os.path.exists(path):
+        return {}
+    with zipfile.ZipFile(path) as file:
+        return {info.filename:info.CRC for info in file.infolist()}
+
+
+class LatencyWarning(UserWarning):
+    """Varning från poll_election_night() när en uppdatering tar \
+längre tid än latency_budget."""
+
+
+def poll_election_night(count_type='valnatt',
+                        year='2018',
+                        interval=60,
+                        latency_budget=30,
+                        base_url="https://data.val.se/val",
+                        max_polls=None,
+                        on_refresh=None):
+    """Hämtar valnattens (eller prelresultatets) räkning om och om \
+igen med 'interval' sekunders mellanrum och uppdaterar bara det \
+som har ändrats sedan förra hämtningen.
+
+Vid varje ny fil jämförs zip-filens innehåll med förra versionen:
+
+- ändrade riksfiler (00K/00L/00R) gör att valresultat och \
+valdeltagande extraheras på nytt för just de valtyperna, liksom \
+alla_partier och alla_valresultat_2006_2018 (se Manifest)
+- ändrade kommunfiler (t.ex. 0114K.xml) läses om, och de \
+kommunernas rader byts ut i valkretsdatan och i distrikts-\
+tabellerna (om de har byggts, se district_results()).
+
+Går hämtningen eller uppdateringen fel (nätverksfel, en fil som \
+inte går att skriva o.s.v.) sparas felet under 'fel' i \
+sammanfattningen och allt som har ändrats sedan den senaste \
+lyckade uppdateringen görs om vid nästa hämtning.
+
+PARAMETRAR
+----------
+count_type : 'valnatt', 'prelresultat' eller 'slutresultat'.
+
+year : valåret som bevakas.
+
+interval : antal sekunder mellan varje hämtning.
+
+latency_budget : hur många sekunder det får ta från att en ny fil \
+har hämtats till att tabellerna är uppdaterade. Överskrids den ges \
+en LatencyWarning och 'över_budget' i sammanfattningen blir True.
+
+base_url : adressen som zip-filerna hämtas ifrån. Kan pekas om \
+till en lokal server vid test.
+
+max_polls : antal hämtningar innan funktionen avslutas. None \
+(default) betyder att den körs tills den avbryts.
+
+on_refresh : en funktion som anropas med sammanfattningen efter \
+varje uppdatering, t.ex. för att räkna om tabellerna i notebooken.
+
+Återger en lista med en sammanfattning per hämtning."""
+    # requests importeras först här, se _download_archive()
+    import requests
+
+    archive = f'data/xml_filer/val_{year}.zip'
+    history = []
+    polls = 0
+
+    # innehållet som tabellerna senast byggdes från. Det flyttas bara
+    # fram när en uppdatering har gått igenom, så att en uppdatering
+    # som misslyckas görs om vid nästa hämtning.
+    previous = archive_members(archive)
+
+    while max_polls is None or polls < max_polls:
+        polls += 1
+        start = time.monotonic()
+
+        summary = {'hämtning':polls,
+                   'ändrad':False,
+                   'valtyper':[],
+                   'kommuner':[],
+                   'sekunder':None,
+                   'över_budget':False,
+                   'fel':None}
+
+        try:
+            summary['ändrad'] = download_archives(count_type=count_type,
+                                                  years=[year],
+                                                  base_url=base_url,
+                                                  workers=1,
+                                                  extract=False)[year]
+
+            current = archive_members(archive)
+            files = [name for name, crc in current.items() \
+                     if previous.get(name) != crc]
+
+            if files:
+                # riksfilerna heter {räkning}_00{valtyp}.xml och
+                # kommunfilerna {räkning}_{kommunkod}{valtyp}.xml
+                national = [re.search(r'_00([KLR])\.xml$', name) \
+                            for name in files]
+                muni = [re.search(r'_(\d{4})[KLR]\.xml$', name) \
+                        for name in files]
+
+                summary['valtyper'] = sorted(set(m.group(1) \
+                                                 for m in national if m))
+                summary['kommuner'] = sorted(set(m.group(1) \
+                                                 for m in muni if m))
+
+                E = ExtractData()
+                if summary['valtyper']:
+                    E.fast_elec_calc(year=year, count_type=count_type,
+                                     elec_types=summary['valtyper'])
+                    E.fast_particip_calc(year=year, count_type=count_type,
+                                         elec_types=summary['valtyper'])
+                    E.all_parties(count_type=count_type)
+                    E.macro_results(count_type=count_type)
+                if summary['kommuner']:
+                    muni_files = [name for name, m in zip(files, muni) if m]
+                    E.muni_elec_meta_data(year, files=muni_files)
+                    # distriktstabellerna hålls bara uppdaterade om de
+                    # redan har byggts
+                    district_types = [types for types in ['K','L','R'] \
+                                      if E.district_path(year, types).exists()]
+                    if district_types:
+                        E.district_results(year, count_type=count_type,
+                                           elec_types=district_types,
+                                           files=muni_files)
+                previous = current
+
+                if on_refresh:
+                    on_refresh(summary)
+
+                summary['sekunder'] = round(time.monotonic() - start, 2)
+                if summary['sekunder'] > latency_budget:
+                    summary['över_budget'] = True
+                    # util och ExtractData stänger av alla varningar, så
+                    # LatencyWarning släpps igenom uttryckligen
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('always', LatencyWarning)
+                        warnings.warn(f"Uppdateringen tog \
+{summary['sekunder']} sekunder, vilket är över budgeten på \
+{latency_budget} sekunder.", LatencyWarning)
+
+        except (requests.RequestException, OSError) as exc:
+            # t.ex. ett nätverksfel eller en fil som inte gick att
+            # skriva: försök igen vid nästa hämtning
+            summary['fel'] = repr(exc)
+
+        history.append(summary)
+
+        if max_polls is not None and polls >= max_polls:
+            break
+        time.sleep(max(0, interval - (time.monotonic() - start)))
+
+    return history
+
+
+class ZipMember:
+    """En xml-fil som ligger i en zip-fil. 'archive' är antingen \
+sökvägen till zip-filen eller en buffer i minnet (t.ex. io.BytesIO). \
+Används överallt där ExtractData annars hade tagit en sökväg till en \
+uppackad fil."""
+
+    def __init__(self, archive, name):
+        self.archive = archive
+        self.name = name
+
+    def __str__(self):
+        if isinstance(self.archive, (str, Path)):
+            return f'{self.archive}::{self.name}'
+        return f'<minne>::{self.name}'
+
+    def zipfile(self):
+        return open_archive(self.archive)
+
+    def info(self):
+        return self.zipfile().getinfo(self.name)
+
+    def open(self):
+        return self.zipfile().open(self.name)
+
+
+# öppnade zip-filer, så att innehållsförteckningen bara läses en gång.
+# Nyckeln är sökvägen (eller id för en buffer), värdet är
+# (process-id, fingeravtryck, ZipFile).
+_ZIPFILES = {}
+
+
+def open_archive(archive):
+    """Öppnar en zip-fil (sökväg eller buffer) och sparar den i \
+_ZIPFILES. En zip-fil som har skrivits om på disk öppnas på nytt, \
+och den gamla stängs.
+
+Varje process öppnar sin egen ZipFile: processerna i en \
+ProcessPoolExecutor ärver annars föräldrans fil och delar dess \
+läsposition, så att de förstör varandras läsningar."""
+    if isinstance(archive, (str, Path)):
+        stat = os.stat(archive)
+        key = str(archive)
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+    else:
+        key = id(archive)
+        fingerprint = None
+
+    cached = _ZIPFILES.get(key)
+    if cached is None or cached[:2] != (os.getpid(), fingerprint):
+        if cached is not None:
+            cached[2].close()
+        _ZIPFILES[key] = (os.getpid(), fingerprint, zipfile.ZipFile(archive))
+    return _ZIPFILES[key][2]
+
+
+def open_xml(source):
+    """Öppnar en xml-fil binärt, oavsett om den ligger uppackad på \
+disk eller i en zip-fil (ZipMember)."""
+    if isinstance(source, ZipMember):
+        return source.open()
+    return open(source, 'rb')
+
+
+def read_table(path):
+    """Läser en sparad tabell. Tabellerna sparas som parquet \
+(se write_table()), men finns bara en äldre xlsx-fil med samma \
+namn läses den i stället."""
+    path = Path(path)
+    if path.suffix == '.parquet' and not path.exists() \
+            and path.with_suffix('.xlsx').exists():
+        return pd.read_excel(path.with_suffix('.xlsx'))
+    if path.suffix == '.xlsx':
+        return pd.read_excel(path)
+    return pd.read_parquet(path)
+
+
+def write_table(df, path, excel=False):
+    """Sparar en tabell kolumnvis som parquet, med datatyperna \
+bevarade. Kolumner som pandas inte kunnat bestämma typen för \
+(object med bara tal) görs om till tal först.
+
+PARAMETRAR
+----------
+df : dataframe som ska sparas
+path : sökväg till .parquet-filen
+excel : True sparar också en xlsx-kopia bredvid, se export_excel()"""
+    df = df.infer_objects()
+    for col in df.columns:
+        if df[col].dtype == object \
+                and df[col].map(lambda x: isinstance(x, str)).sum() == 0:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    df.to_parquet(path, index=False)
+    if excel:
+        export_excel([path])
+
+
+def export_excel(paths=None, folder=None):
+    """Exporterar sparade tabeller till xlsx för reportrarna. \
+Görs som ett sista steg; inget i analysen läser xlsx-filerna.
+
+PARAMETRAR
+----------
+paths : lista med .parquet-filer. Default är alla tabeller under \
+data/resultat och data/meta_filer
+folder : mapp att spara i. Default är samma mapp som tabellen"""
+    if paths is None:
+        paths = sorted(Path('data/resultat').rglob('*.parquet')) + \
+                sorted(Path('data/meta_filer').rglob('*.parquet'))
+
+    exported = []
+    for path in paths:
+        path = Path(path)
+        target = path.with_suffix('.xlsx')
+        if folder is not None:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            target = Path(folder) / target.name
+        exported.append(write_workbook(target, read_table(path)))
+    return exported
+
+
+def to_number(value):
+    """Tolkar ett tal ur xml-filerna, där decimaler skrivs med \
+kommatecken. Saknade värden blir NaN."""
+    if not value:
+        return np.nan
+    return float(value.replace(',','.'))
+
+
+# kolumnerna i de olika tabellerna som ExtractData bygger upp.
+# 'str' är text, 'int' heltal (som får sakna värde) och 'float'
+# decimaltal.
+AREA_COLUMNS = {'kommun':'str',
+                'kommunkod':'str'}
+
+RESULT_COLUMNS = {'parti':'str',
+                  'mandat':'int',
+                  'mandat_fgval':'int',
+                  'röster':'int',
+                  'röster_fgval':'int',
+                  'procent':'float',
+                  'procent_fgval':'float'}
+
+PARTICIP_COLUMNS = {'kommun':'str',
+                    'kommunkod':'str',
+                    'summa_mandat':'int',
+                    'summa_röster':'int',
+                    'summa_röster_fgval':'int',
+                    'summa_röstberättigade':'int',
+                    'summa_röstberättigade_fgval':'int',
+                    'valdeltagande':'float',
+                    'valdeltagande_fgval':'float'}
+
+PARTY_COLUMNS = {'val':'str',
+                 'parti':'str',
+                 'beteckning':'str',
+                 'färg':'str'}
+
+
+DISTRICT_COLUMNS = {'kommunkod':'str',
+                    'valdistriktkod':'str',
+                    'parti':'str',
+                    'röster':'int',
+                    'procent':'float'}
+
+DISTRICT_PARTICIP_COLUMNS = {'kommun':'str',
+                             'kommunkod':'str',
+                             'valkrets':'str',
+                             'valdistrikt':'str',
+                             'valdistriktkod':'str',
+                             'summa_röster':'int',
+                             'röstberättigade':'int',
+                             'valdeltagande':'float'}
+
+
+class ColumnBuffer:
+    """Samlar rader kolumnvis i stället för som en dictionary per \
+rad. Talen tolkas redan när raden läggs till (se to_number()) och \
+lagras i förallokerade numpy-arrayer, som dubbleras i storlek när \
+de blir fulla. Textkolumner lagras i vanliga listor.
+
+'columns' är en dictionary {kolumnnamn: 'str'/'int'/'float'}, t.ex. \
+RESULT_COLUMNS."""
+
+    def __init__(self, columns, capacity=256):
+        self.columns = columns
+        self.size = 0
+        self.capacity = capacity
+        self.data = {name:[] if kind == 'str' else np.empty(capacity) \
+                     for name, kind in columns.items()}
+
+    def __len__(self):
+        return self.size
+
+    def append(self, *values):
+        """Lägger till en rad. Värdena anges i samma ordning som \
+kolumnerna, ett per kolumn."""
+        if len(values) != len(self.columns):
+            raise ValueError(f'{len(values)} värden till '
+                             f'{len(self.columns)} kolumner')
+        if self.size == self.capacity:
+            self.capacity *= 2
+            for name, kind in self.columns.items():
+                if kind != 'str':
+                    self.data[name] = np.resize(self.data[name],
+                                                self.capacity)
+
+        for (name, kind), value in zip(self.columns.items(), values):
+            if kind == 'str':
+                self.data[name].append(value)
+            else:
+                self.data[name][self.size] = to_number(value)
+        self.size += 1
+
+    def to_frame(self):
+        """Gör om bufferten till en dataframe med rätt datatyper."""
+        frame = {}
+        for name, kind in self.columns.items():
+            if kind == 'str':
+                frame[name] = pd.Series(self.data[name], dtype='object')
+            elif kind == 'int':
+                frame[name] = pd.Series(self.data[name][:self.size])\
+                                .astype('Int64')
+            else:
+                frame[name] = pd.Series(self.data[name][:self.size])
+        return pd.DataFrame(frame, columns=list(self.columns))
+
+
+def compact(df):
+    """Gör om en dataframe från ColumnBuffer.to_frame() till så \
+små datatyper som möjligt: text blir kategorier, heltal Int32 och \
+decimaltal float32."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype('category')
+        elif str(df[col].dtype) == 'Int64':
+            df[col] = df[col].astype('Int32')
+        elif df[col].dtype == 'float64':
+            df[col] = df[col].astype('float32')
+    return df
+
+
+def replace_municipalities(old, new, names):
+    """Byter ut raderna i 'old' för kommunerna i kommunfilerna \
+'names' ({räkning}_{kommunkod}{valtyp}.xml) mot raderna i 'new'. \
+Raderna sorteras sedan på kommunkod, så att de kommer i samma \
+ordning som när alla kommunfiler läses om. Kategorier i 'old' \
+(se compact()) görs om till text först."""
+    codes = [m.group(1) for m in \
+             (re.search(r'_(\d{4})[KLR]\.xml$', str(name)) \
+              for name in names) if m]
+    old = old.loc[~old['kommunkod'].astype(str).isin(codes)]
+    old = old.astype({col:object for col in old.columns \
+                      if isinstance(old[col].dtype, pd.CategoricalDtype)})
+    df = pd.concat([old, new], ignore_index=True)
+    return df.sort_values('kommunkod', kind='stable', ignore_index=True)
+
+
+def file_hash(path):
+    """Räknar ut en sha256-summa på innehållet i en fil."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Manifest:
+    """Håller reda på vilka källfiler (xml) varje utdatafil har \
+skapats från. För varje körning ('enhet', t.ex. \
+'fast_elec_calc:2018K') sparas källfilernas sökväg, storlek, \
+ändringstid och sha256-summa, vilken funktion som körts samt \
+vilka filer den skrev. Manifestet ligger i \
+data/meta_filer/manifest.json.
+
+Används av ExtractData för att hoppa över de år och valtyper vars \
+källfiler inte har ändrats sedan förra körningen."""
+
+    def __init__(self, path='data/meta_filer/manifest.json'):
+        self.path = Path(path)
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)
         else:
-            url = f"https://data.val.se/val/\
-val{year}/slutresultat/slutresultat.zip"
-
-        request = requests.get(url)
-
-        file = zipfile.ZipFile(io.BytesIO(request.content))
-        file.extractall(f'data/xml_filer/val_{year}/')
-
-
-
-
+            self.entries = {}
+
+    def is_current(self, unit, sources, outputs, ignore=()):
+        """True om alla källfiler är oförändrade sedan enheten \
+senast kördes och alla dess utdatafiler finns kvar. Källfilerna i \
+'ignore' jämförs inte (och får vara nya), t.ex. de filer som ska \
+läsas om när bara en del av utdatan byggs om."""
+        entry = self.entries.get(unit)
+        if entry is None:
+            return False
+
+        ignore = set(str(source) for source in ignore)
+        members = [source for source in sources \
+                   if isinstance(source, ZipMember) \
+                   and str(source) not in ignore]
+        sources = [source for source in sources \
+                   if not isinstance(source, ZipMember) \
+                   and str(source) not in ignore]
+
+        outputs = [str(path) for path in outputs]
+
+        if sorted(set(entry['källor']) - ignore) != \
+                sorted(str(source) for source in sources + members) or \
+           sorted(entry['utdata']) != sorted(outputs):
+            return False
+
+        if not all(os.path.exists(path) for path in outputs):
+            return False
+
+        # filer i zip-filer jämförs med storlek och crc32-summa,
+        # som redan finns i zip-filens innehållsförteckning
+        for member in members:
+            try:
+                info = member.info()
+            except (OSError, KeyError):
+                return False
+            if entry['källor'][str(member)] != {'storlek':info.file_size,
+                                                'crc32':info.CRC}:
+                return False
+
+        for path in sources:
+            path = str(path)
+            if not os.path.exists(path):
+                return False
+
+            old = entry['källor'][path]
+            stat = os.stat(path)
+            if stat.st_size != old['storlek']:
+                return False
+
+            # samma storlek och ändringstid: ingen anledning att
+            # läsa om filen
+            if stat.st_mtime_ns == old['mtime']:
+                continue
 
+            if file_hash(path) != old['sha256']:
+                return False
+
+            # filen har skrivits om men med samma innehåll
+            old['mtime'] = stat.st_mtime_ns
+
+        return True
+
+    def fingerprint(self, sources):
+        """Källfilernas fingeravtryck, så som de sparas i \
+manifestet. Ska tas innan källfilerna läses och skickas till \
+record(), så att en källfil som byts ut under körningen inte \
+sparas med utdata som skapats från den gamla versionen."""
+        källor = {}
+        for path in sources:
+            if isinstance(path, ZipMember):
+                info = path.info()
+                källor[str(path)] = {'storlek':info.file_size,
+                                     'crc32':info.CRC}
+                continue
+            stat = os.stat(path)
+            källor[str(path)] = {'storlek':stat.st_size,
+                                 'mtime':stat.st_mtime_ns,
+                                 'sha256':file_hash(path)}
+        return källor
+
+    def record(self, unit, function, sources, outputs, fingerprints=None):
+        """Sparar källfilernas fingeravtryck för en enhet som \
+just har körts. 'fingerprints' är fingeravtrycken från \
+fingerprint() innan körningen; utan dem tas de nu."""
+        källor = fingerprints if fingerprints is not None \
+            else self.fingerprint(sources)
+
+        self.entries[unit] = {'funktion':function,
+                              'källor':källor,
+                              'utdata':[str(path) for path in outputs]}
+
+    def save(self):
+        if not os.path.isdir(self.path.parent):
+            os.makedirs(self.path.parent)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
 
 
 class ExtractData:
@@ -283,87 +974,370 @@ information från Valmyndighetens xml-filer med valresultatet. \
     import warnings
     warnings.filterwarnings("ignore")
 
-    def fast_elec_calc(self, year, count_type='prelresultat'):
-        """Huvudfunktionen för att ta fram valresultaten."""
-        elec_types = ['K','L','R']
+    def __init__(self, archives=None):
+        """PARAMETRAR
+----------
+archives : en dictionary {år: zip-fil} där zip-filen är en sökväg \
+eller en buffer i minnet (t.ex. io.BytesIO med en nedladdad fil). \
+Xml-filerna läses då direkt ur zip-filen. För år som inte finns \
+med används data/xml_filer/val_{år}.zip om den finns, annars de \
+uppackade filerna i data/xml_filer/val_{år}/."""
+        self.archives = {str(year):archive for year, archive \
+                         in (archives or {}).items()}
+
+        # extraherad data per riksfil, så att varje fil bara
+        # behöver läsas en gång per körning
+        self.extracts = {}
+
+        # källfilernas fingeravtryck från tidigare körningar
+        self.manifest = Manifest()
+
+    def archive(self, year):
+        """Zip-filen som årets xml-filer läses ifrån, eller None \
+om de ska läsas från uppackade filer."""
+        if year in self.archives:
+            return self.archives[year]
+        path = f'data/xml_filer/val_{year}.zip'
+        if os.path.exists(path):
+            return path
+        return None
+
+    def xml_source(self, year, name):
+        """En xml-fil för ett valår, antingen som ZipMember eller \
+som sökväg till den uppackade filen."""
+        archive = self.archive(year)
+        if archive is not None:
+            return ZipMember(archive, name)
+        return Path(f"data/xml_filer/val_{year}/{name}")
+
+    def xml_names(self, year):
+        """Namnen på alla filer för ett valår."""
+        archive = self.archive(year)
+        if archive is not None:
+            return open_archive(archive).namelist()
+        return os.listdir(f'data/xml_filer/val_{year}/')
+
+    def xml_path(self, year, types, count_type='prelresultat'):
+        """Returnerar riksfilen (00{valtyp}.xml) för ett valår, se \
+xml_source(). För 2010 och 2014 är det alltid sluträkningen."""
+        if year == '2018':
+            return self.xml_source(year, f"{count_type}_00{types}.xml")
+        return self.xml_source(year, f"slutresultat_00{types}.xml")
+
+    def national_paths(self, count_type='prelresultat'):
+        """Alla riksfiler för 2010, 2014 och 2018."""
+        return [self.xml_path(year, types, count_type) \
+                for year in ['2010','2014','2018'] \
+                for types in ['K','L','R']]
+
+    def results_path(self, year, types):
+        return Path(f'data/resultat/resultat_{year}/\
+valresultat_{year}{types}.parquet')
+
+    def particip_path(self, year, types):
+        return Path(f'data/meta_filer/valdeltagande/\
+valdeltagande_{year}{types}.parquet')
+
+    def iter_file(self, source, types):
+        """Strömmande läsning av en riksfil. Återger par av \
+(sort, element) där sort är:
+
+- 'parti' : partiernas metadata (barn till rotelementet)
+- 'area' : ett LÄN-element (landstingsval) eller ett KOMMUN-element \
+(kommun- och riksdagsval)
+- 'nation' : NATION-elementet med resultatet på riksnivå. Kommer \
+sist, när alla län redan har tömts.
+
+Elementen töms direkt efter att de har lämnats ut, så hela \
+trädet byggs aldrig upp i minnet."""
+        parser = ET.XMLParser(encoding="ISO-8859-1")
+        stack = []
+        with open_xml(source) as f:
+            for event, elem in ET.iterparse(f,
+                                            events=('start','end'),
+                                            parser=parser):
+                if event == 'start':
+                    stack.append(elem.tag)
+                    continue
+
+                stack.pop()
+                parent = stack[-1] if stack else None
+
+                if len(stack) == 1 and elem.tag != 'NATION':
+                    yield 'parti', elem
+                    elem.clear()
+                elif elem.tag == 'NATION':
+                    yield 'nation', elem
+                    elem.clear()
+                elif types == 'L' and elem.tag == 'LÄN' \
+                        and parent == 'NATION':
+                    yield 'area', elem
+                    elem.clear()
+                elif types != 'L' and elem.tag == 'KOMMUN' \
+                        and parent == 'KRETS_RIKSDAG':
+                    yield 'area', elem
+                    elem.clear()
+                elif elem.tag in ['KRETS_LANDSTING','KRETS_RIKSDAG','LÄN']:
+                    # dessa block behövs inte längre när de är färdiglästa
+                    elem.clear()
+
+    def dom_file(self, source, types):
+        """Samma som iter_file(), men bygger hela xml-trädet först. \
+Används när stream=False."""
+        with open_xml(source) as f:
+            xml_data = f.read()
+
+        root = ET.XML(xml_data, parser=ET.XMLParser(encoding="ISO-8859-1"))
+        root_nation = [child for child in root \
+                     if child.tag == 'NATION'][0]
+
+        for child in root:
+            if child.tag != 'NATION':
+                yield 'parti', child
+
+        for child in root_nation:
+            if child.tag == 'LÄN':
+                if types == 'L':
+                    yield 'area', child
+                else:
+                    for subchild in child:
+                        if subchild.tag == 'KRETS_RIKSDAG':
+                            for subsubchild in subchild:
+                                if subsubchild.tag == 'KOMMUN':
+                                    yield 'area', subsubchild
+
+        yield 'nation', root_nation
+
+    def extract_file(self, year, types, count_type='prelresultat',
+                     stream=True):
+        """Läser en riksfil i ett enda svep och plockar samtidigt \
+ut allt som övriga funktioner i klassen behöver. Återger en \
+dictionary med listorna:
+
+- 'valresultat' : partiresultat per kommun/län (fast_elec_calc)
+- 'valdeltagande' : valdeltagande per kommun/län (fast_particip_calc)
+- 'partier' : partiernas förkortning, beteckning och färg (all_parties)
+- 'riket' : partiresultat på riksnivå (data_fetcher)
+
+Listorna är ColumnBuffer-objekt, som görs om till dataframes med \
+.to_frame(). Resultatet sparas i self.extracts, så att samma fil inte läses \
+om förrän den har ändrats på disk."""
+        source = self.xml_path(year, types, count_type)
+        if isinstance(source, ZipMember):
+            info = source.info()
+            key = (str(source), info.file_size, info.CRC)
+        else:
+            stat = os.stat(source)
+            key = (str(source), stat.st_size, stat.st_mtime_ns)
+
+        if key in self.extracts:
+            return self.extracts[key]
+
+        if stream:
+            elements = self.iter_file(source, types)
+        else:
+            elements = self.dom_file(source, types)
+
+        extract = {'valresultat':ColumnBuffer({**AREA_COLUMNS,
+                                               **RESULT_COLUMNS}),
+                   'valdeltagande':ColumnBuffer(PARTICIP_COLUMNS),
+                   'partier':ColumnBuffer(PARTY_COLUMNS),
+                   'riket':ColumnBuffer(RESULT_COLUMNS)}
+
+        for kind, elem in elements:
+            if kind == 'area':
+                self.area_results(extract['valresultat'], elem, types, year)
+                name = elem.attrib.get('NAMN')
+                code = elem.attrib.get('KOD')
+                nr_mandat = elem.attrib.get('MANDAT_VALOMRÅDE')
+                for subchild in elem:
+                    if subchild.tag == 'VALDELTAGANDE':
+                        self.valdeltagande(extract['valdeltagande'],
+                                           name,
+                                           code,
+                                           nr_mandat,
+                                           subchild)
+
+            elif kind == 'parti':
+                self.party_meta(extract['partier'], types, year, elem)
+
+            elif kind == 'nation':
+                for x in elem:
+                    if x.tag not in ['OGILTIGA','VALDELTAGANDE','LÄN']:
+                        self.muni_data_fetcher(extract['riket'], x, year)
+
+        self.extracts[key] = extract
+        return extract
+
+    def area_results(self, buffer, area, types, year):
+        """Lägger till partiresultaten ur ett LÄN- eller KOMMUN-element \
+från iter_file()/dom_file() i 'buffer'."""
+        name = area.attrib.get('NAMN')
+        code = area.attrib.get('KOD')
+
+        if types == 'L':
+            for x in area:
+                if x.tag not in ['KRETS_LANDSTING',
+                                 'KRETS_RIKSDAG',
+                                 'VALDELTAGANDE',
+                                 'SAMMANFATTNING_VALDA',
+                                 'ÖVRIGA_GILTIGA']:
+                    self.muni_data_fetcher(buffer, x, year,
+                                           name=name, code=code)
+            for subchild in area:
+                if subchild.tag == 'ÖVRIGA_GILTIGA':
+                    for x in subchild:
+                        if x.tag == 'GILTIGA':
+                            self.muni_data_fetcher(buffer, x, year,
+                                                   name=name, code=code)
+        else:
+            for x in area:
+                if x.tag != 'VALDELTAGANDE':
+                    self.muni_data_fetcher(buffer, x, year,
+                                           name=name, code=code)
+
+            for subchild in area:
+                if subchild.tag == 'ÖVRIGA_GILTIGA':
+                    for x in subchild:
+                        if x.tag == 'GILTIGA':
+                            self.muni_data_fetcher(buffer, x, year,
+                                                   name=name, code=code)
+
+    def extract_all(self, years=['2010','2014','2018'],
+                    count_type="prelresultat", force=False):
+        """Bygger om alla resultat- och metafiler. Varje riksfil \
+läses bara en gång, oavsett hur många filer som skapas ur den. \
+Filer vars källor inte har ändrats hoppas över, om inte force=True."""
+        for year in years:
+            self.fast_elec_calc(year=year, count_type=count_type,
+                                force=force)
+            self.fast_particip_calc(year=year, count_type=count_type,
+                                    force=force)
+
+        self.all_parties(count_type=count_type, force=force)
+        self.macro_results(count_type=count_type, force=force)
+
+    def parallel_extract(self, years=['2010','2014','2018'],
+                         count_type="prelresultat", workers=None,
+                         force=False):
+        """Som extract_all(), men varje kombination av valår och \
+valtyp läses och sparas i en egen process. Alla kombinationer är \
+oberoende av varandra, så körningen skalar med antalet kärnor.
+
+PARAMETRAR
+----------
+years : vilka valår som ska extraheras.
+
+count_type : vilken räkning som ska läsas för 2018.
+
+workers : antal processer. Default (None) är en per kärna.
+
+force : om True körs alla enheter, även de vars källfiler inte har \
+ändrats sedan förra körningen (se Manifest).
+
+Resultaten hämtas tillbaka i samma ordning som de skickades ut, \
+så utdatan blir densamma oavsett antal processer. De sammanställda \
+filerna (alla_partier och alla_valresultat_2006_2018) skapas till \
+sist i huvudprocessen, utan att riksfilerna läses en gång till."""
+        units = [(year, types, count_type) for year in years \
+                 for types in ['K','L','R'] \
+                 if force or not (self.is_current('fast_elec_calc',
+                                                  year, types, count_type) \
+                              and self.is_current('fast_particip_calc',
+                                                  year, types, count_type))]
+
+        if units:
+            fingerprints = [self.fingerprint('fast_elec_calc', year, types,
+                                             count_type) \
+                            for year, types, _ in units]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                archives = [self.archives] * len(units)
+                for (year, types, _), fingerprint, (key, extract) in \
+                        zip(units, fingerprints,
+                            executor.map(_extract_unit, *zip(*units),
+                                         archives)):
+                    self.extracts[key] = extract
+                    self.record('fast_elec_calc', year, types, count_type,
+                                fingerprint)
+                    self.record('fast_particip_calc', year, types, count_type,
+                                fingerprint)
+            self.manifest.save()
+
+        self.all_parties(count_type=count_type, force=force)
+        self.macro_results(count_type=count_type, force=force)
+
+    def unit_paths(self, function, year, types, count_type):
+        """Källfiler och utdatafiler för en enhet i manifestet."""
+        sources = [self.xml_path(year, types, count_type)]
+        if function == 'fast_elec_calc':
+            outputs = [self.results_path(year, types)]
+        else:
+            outputs = [self.particip_path(year, types)]
+        return sources, outputs
+
+    def is_current(self, function, year, types, count_type):
+        sources, outputs = self.unit_paths(function, year, types, count_type)
+        return self.manifest.is_current(f'{function}:{year}{types}',
+                                        sources, outputs)
+
+    def fingerprint(self, function, year, types, count_type):
+        sources, _ = self.unit_paths(function, year, types, count_type)
+        return self.manifest.fingerprint(sources)
+
+    def record(self, function, year, types, count_type, fingerprints=None):
+        sources, outputs = self.unit_paths(function, year, types, count_type)
+        self.manifest.record(f'{function}:{year}{types}', function,
+                             sources, outputs, fingerprints)
+
+    def fast_elec_calc(self, year, count_type='prelresultat',
+                       elec_types=['K','L','R'], stream=True, force=False):
+        """Huvudfunktionen för att ta fram valresultaten.
+
+PARAMETRAR
+----------
+year : valåret som ska extraheras.
+
+count_type : vilken räkning som ska läsas för 2018.
+
+elec_types : valtyperna som ska extraheras, t.ex. bara de vars \
+riksfil har ändrats.
+
+stream : om True (default) läses xml-filerna strömmande med \
+iter_file(), så att varje kommun/län töms ur minnet direkt när \
+den har lästs. Med False byggs hela xml-trädet upp först.
+
+force : om True skrivs filerna om även när xml-filerna är \
+oförändrade sedan förra körningen."""
         for types in elec_types:
-            if not os.path.isdir(f'data/resultat'):
-                os.makedirs(f'data/resultat')
-            if not os.path.isdir(f'data/resultat/resultat_{year}'):
-                os.makedirs(f'data/resultat/resultat_{year}')
+            if not force and self.is_current('fast_elec_calc',
+                                             year, types, count_type):
+                continue
+            fingerprint = self.fingerprint('fast_elec_calc',
+                                           year, types, count_type)
+            extract = self.extract_file(year, types, count_type,
+                                        stream=stream)
+            self.write_results(year, types, extract)
+            self.record('fast_elec_calc', year, types, count_type,
+                        fingerprint)
+        self.manifest.save()
+
+    def write_results(self, year, types, extract):
+        """Sparar partiresultaten från extract_file() till \
+valresultat_{år}{valtyp}."""
+        if not os.path.isdir(f'data/resultat'):
+            os.makedirs(f'data/resultat')
+        if not os.path.isdir(f'data/resultat/resultat_{year}'):
+            os.makedirs(f'data/resultat/resultat_{year}')
+
+        results = extract['valresultat'].to_frame()
+
+        # Folkpartiet heter idag 'Liberalerna':
+        results.loc[results.parti=='FP','parti'] = 'L'
         
-            if year == '2018':
-                with open(f"data/xml_filer/val_{year}/\
-{count_type}_00{types}.xml", encoding="ISO-8859-1") as f:
-                    xml_data = f.read()
-            else:
-                with open(f"data/xml_filer/val_{year}/\
-slutresultat_00{types}.xml", encoding="ISO-8859-1") as f:
-                    xml_data = f.read()
-
-            root_nation = [child for child in ET.XML(xml_data) \
-                         if child.tag == 'NATION'][0].getchildren()
-
-            a_list = []
-            for child in root_nation:
-                #print('Nivå 1', child)
-                if child.tag == 'LÄN':
-                    if types == 'L':
-                        name = child.attrib.get('NAMN')
-                        code = child.attrib.get('KOD')
-                        [a_list.append(self.muni_data_fetcher(x,
-                                                              year=year,
-                                                              name=name,
-                                                              code=code)) \
-                                        for x in child \
-                                        if x.tag not in ['KRETS_LANDSTING',
-                                                         'KRETS_RIKSDAG',
-                                                         'VALDELTAGANDE',
-                                                         'SAMMANFATTNING_VALDA',
-                                                         'ÖVRIGA_GILTIGA']]
-                        for subchild in child:    
-                            if subchild.tag == 'ÖVRIGA_GILTIGA':
-                                [a_list.append(self.muni_data_fetcher(x,
-                                                                      year=year,
-                                                                      name=name,
-                                                                      code=code)) \
-                                        for x in subchild if x.tag == 'GILTIGA']
-                                
-                    else:
-                        for subchild in child:
-                            if subchild.tag == 'KRETS_RIKSDAG':
-                                for subsubchild in subchild:
-                                    
-                                    if subsubchild.tag == 'KOMMUN':
-                                    
-                                        name = subsubchild.attrib.get('NAMN')
-                                        code = subsubchild.attrib.get('KOD')
-                                    
-                                        [a_list.append(self.muni_data_fetcher(x,
-                                                                         year,
-                                                                         name=name,
-                                                                         code=code)) \
-                                             for x in subsubchild\
-                                             if x.tag != 'VALDELTAGANDE']
-                                    
-                                        for subsubsubchild in subsubchild:
-                                            if subsubsubchild.tag == \
-                                                'ÖVRIGA_GILTIGA':
-                                                [a_list.append(self.muni_data_fetcher(x,
-                                                                                 year,
-                                                                                 name=name,
-                                                                                 code=code)) \
-                                                 for x in subsubsubchild \
-                                                    if x.tag == 'GILTIGA']
-            results = pd.DataFrame(a_list)
-
-            # Folkpartiet heter idag 'Liberalerna':
-            results.loc[results.parti=='FP','parti'] = 'L'
-            
-            # Båstad hade omval 2015 i kommunen. 
-            # Detta block kompletterar dessa siffror
-            # från en fil med data från SCB. 
-            # Denna ligger i meta_filer-mappen
+        # Båstad hade omval 2015 i kommunen. 
+        # Detta block kompletterar dessa siffror
+        # från en fil med data från SCB. 
+        # Denna ligger i meta_filer-mappen
 #             if (types == 'K') and (year == '2014'):
 #                 #print(types, year)
 #                 path_båstad = Path('data/\
@@ -377,144 +1351,96 @@ slutresultat_00{types}.xml", encoding="ISO-8859-1") as f:
 #                         #print(var)
 #                         results.loc[(results['kommun']=='Båstad')&\
 #                         (results['parti']==f'{parti}'),f'{var}'] = val
-                        
-            
-            # Följande avkommenterade rader är ifall man vill
-            # addera Gotland till landstingsdatat:
-            #if types == 'L':
-            #    results = gotland_adder(results,year)
-            
-            path_results = Path(f'data/resultat/resultat_{year}/\
-valresultat_{year}{types}.xlsx')
-
-            results.to_excel(path_results,index=False)
+                    
+        
+        # Följande avkommenterade rader är ifall man vill
+        # addera Gotland till landstingsdatat:
+        #if types == 'L':
+        #    results = gotland_adder(results,year)
+        
+        write_table(results, self.results_path(year, types))
 
-    def fast_particip_calc(self, year, count_type="prelresultat"):
+    def fast_particip_calc(self, year, count_type="prelresultat",
+                           elec_types=['K','L','R'], force=False):
         """Hämtar all meta-data om valen, dvs all information om totalt antal \
-röstande samt valdeltagande."""
-        elec_types = ['K','L','R']
+röstande samt valdeltagande. Bara valtyperna i 'elec_types' läses, \
+och valtyper vars xml-fil inte har ändrats sedan förra körningen \
+hoppas över, om inte force=True."""
         for types in elec_types:
-            
-            
-            if not os.path.isdir(f'data/meta_filer'):
-                os.makedirs(f'data/meta_filer')
-                
-            
-            if not os.path.isdir(f'data/meta_filer/valdeltagande'):
-                os.makedirs(f'data/meta_filer/valdeltagande')
-            
-            if year == '2018':
-                with open(f"data/xml_filer/val_{year}/\
-{count_type}_00{types}.xml", 
-                        encoding="ISO-8859-1") as f:
-                    xml_data = f.read()
-            else:
-                with open(f"data/xml_filer/val_{year}/\
-slutresultat_00{types}.xml", 
-                        encoding="ISO-8859-1") as f:
-                    xml_data = f.read()
-
-            root_nation = [child for child in ET.XML(xml_data) \
-                         if child.tag == 'NATION'][0].getchildren()
-
-            a_list = []
-            for child in root_nation:
-                #print('Nivå 1', child)
-                if child.tag == 'LÄN':
-                    län_name = child.attrib.get('NAMN')
-                    län_code = child.attrib.get('KOD')
-                    län_nr_mandat = child.attrib.get('MANDAT_VALOMRÅDE')
-                    if types == 'L':
-                        for subchild in child:    
-                            if subchild.tag == 'VALDELTAGANDE':
-                                a_list.append(self.valdeltagande(län_name,
-                                                            län_code,
-                                                            län_nr_mandat,
-                                                            subchild))
+            if not force and self.is_current('fast_particip_calc',
+                                             year, types, count_type):
+                continue
+            fingerprint = self.fingerprint('fast_particip_calc',
+                                           year, types, count_type)
+            extract = self.extract_file(year, types, count_type)
+            self.write_particip(year, types, extract)
+            self.record('fast_particip_calc', year, types, count_type,
+                        fingerprint)
+        self.manifest.save()
+
+    def write_particip(self, year, types, extract):
+        """Sparar valdeltagandet från extract_file() till \
+valdeltagande_{år}{valtyp}."""
+        if not os.path.isdir(f'data/meta_filer'):
+            os.makedirs(f'data/meta_filer')
+
+        if not os.path.isdir(f'data/meta_filer/valdeltagande'):
+            os.makedirs(f'data/meta_filer/valdeltagande')
+
+        results = extract['valdeltagande'].to_frame()
+        
+        write_table(results, self.particip_path(year, types))
 
-                    else:
-                        for subchild in child:
-                            if subchild.tag == 'KRETS_RIKSDAG':
-                                for subsubchild in subchild:
-                                    if subsubchild.tag == 'KOMMUN':
-                                        name = \
-                                            subsubchild.attrib.get('NAMN')
-                                        
-                                        code = \
-                                            subsubchild.attrib.get('KOD')
-                                        
-                                        nr_mandat = \
-                                            subsubchild.attrib\
-                                                .get('MANDAT_VALOMRÅDE')
-                                        
-                                        for subsubsubchild in subsubchild:
-                                            if subsubsubchild.tag == 'VALDELTAGANDE':
-                                                a_list.append(\
-                                                    self.valdeltagande(name,
-                                                                  code,
-                                                                  nr_mandat,
-                                                                  subsubsubchild))
-                                            
-            results = pd.DataFrame(a_list)
-            
-            for col in ['valdeltagande','valdeltagande_fgval']:
-                results[col] = self.comma_remover(results[col])
-            
-            path_results = Path(f'data/meta_filer/valdeltagande/\
-valdeltagande_{year}{types}.xlsx')
-            results.to_excel(path_results,index=False)
 
+    def party_meta(self, buffer, election, year, child):
+        """Lägger till metadata om ett parti i 'buffer'. \
+Används av extract_file()."""
+        buffer.append(year + election,
+                      child.attrib.get('FÖRKORTNING'),
+                      child.attrib.get('BETECKNING'),
+                      child.attrib.get('FÄRG'))
 
-    def all_parties(self, count_type="slutresultat"):
+    def all_parties(self, count_type="slutresultat", force=False):
         """Hämtar all metadata om alla partier för åren 2006, 2010, \
 2014 och 2018. Partierna för 2006 finns i samma data som för \
 2010."""
         
-        def partier(election,year,child):
-            a_dict = {}
-            a_dict['val'] = year + election
-            a_dict['parti'] = child.attrib.get('FÖRKORTNING')
-            a_dict['beteckning'] = child.attrib.get('BETECKNING')
-            a_dict['färg'] = child.attrib.get('FÄRG')
-
-            return a_dict
-        
-        elec_types = ['K','L','R']
-        a_list = []
-        for year in ['2010','2014','2018']:
-            for types in elec_types:
-                if year == '2018':
-                    with open(f"data/xml_filer/val_{year}/{count_type}_00{types}.xml",
-                                encoding="ISO-8859-1") as f:
-                        xml_data = f.read()
-                else:
-                    with open(f"data/xml_filer/val_{year}/slutresultat_00{types}.xml",
-                                encoding="ISO-8859-1") as f:
-                        xml_data = f.read()
-                [a_list.append(partier(types,year,x)) for x in \
-                               ET.XML(xml_data).getchildren() if x.tag != 'NATION']
+        path_partierna = Path('data/resultat/alla_partier.parquet')
+
+        sources = self.national_paths(count_type)
+        if not force and self.manifest.is_current('all_parties', sources,
+                                                  [path_partierna]):
+            return
+        fingerprint = self.manifest.fingerprint(sources)
 
-        df = pd.DataFrame(a_list)
+        elec_types = ['K','L','R']
+        df = pd.concat([self.extract_file(year, types,
+                                          count_type)['partier'].to_frame() \
+                        for year in ['2010','2014','2018'] \
+                        for types in elec_types],
+                       ignore_index=True)
         
         df.loc[df.parti=='FP','parti'] = 'L'
         df.loc[df.parti=='L','beteckning'] = 'Liberalerna (tidigare Folkpartiet)'
         
         df.loc[df.parti=='M','beteckning'] = 'Moderaterna'
-        
-        path_partierna = Path('data/resultat/alla_partier.xlsx')
 
-        df.loc[:,['val',
-                    'parti',
-                    'beteckning']]\
-            .to_excel(path_partierna,index=False)
+        write_table(df.loc[:,['val',
+                              'parti',
+                              'beteckning']],
+                    path_partierna)
+
+        self.manifest.record('all_parties', 'all_parties', sources,
+                             [path_partierna], fingerprint)
+        self.manifest.save()
 
 
     def data_fetcher(self,elec_type,count_type='prelresultat'):
         import numpy as np
 
-        path_partier = Path('data/resultat/alla_partier.xlsx')
+        path_partier = Path('data/resultat/alla_partier.parquet')
 
-        partierna = pd.read_excel(path_partier)
+        partierna = read_table(path_partier)
 
 
         ph = pd.DataFrame(columns=['mandat',
@@ -543,31 +1469,9 @@ valdeltagande_{year}{types}.xlsx')
                 ph = pd.concat([ph,df])
                 continue
 
-            a_list = []
-
-            if year == '2018':
-                with open(f"data/xml_filer/val_{year}/{count_type}_00{elec_type}.xml",
-                            encoding="ISO-8859-1") as f:
-                    xml_data = f.read()
-            else:
-                with open(f"data/xml_filer/val_{year}/slutresultat_00{elec_type}.xml",
-                            encoding="ISO-8859-1") as f:
-                    xml_data = f.read()
-            a_list=[]
-
-            for child in ET.XML(xml_data).getchildren():
-                if child.tag == 'NATION':
-                    [a_list.append(self.muni_data_fetcher(x,year)) for x in \
-                            child.getchildren() if x.tag not in ['OGILTIGA',
-                                                                'VALDELTAGANDE',
-                                                                'LÄN']]
-                    #for subchild in child:
-                    #    if subchild.tag == 'ÖVRIGA_GILTIGA':
-                    #        [a_list.append(self.muni_data_fetcher(x,year)) for x in \
-                    #        subchild.getchildren() if x.tag not in ['HANDSKRIVNA',
-                    #                                                'ÖVRIGA_FGVAL']]
             # spara ned årsdatan i en df
-            df = pd.DataFrame(a_list)
+            df = self.extract_file(year, elec_type,
+                                   count_type)['riket'].to_frame()
 
             # märk datan efter vilket val det gäller
             df['val'] = f'{year}{elec_type}'
@@ -582,7 +1486,7 @@ valdeltagande_{year}{types}.xlsx')
 
         # formattera nummerdata
         for col in ['procent','procent_fgval']:
-            ph[col] = ph[col].fillna(0).str.replace(',','.').astype('float')
+            ph[col] = ph[col].fillna(0).astype('float')
 
         # formattera nummerdata
         for col in ['röster','röster_fgval']:
@@ -594,13 +1498,22 @@ valdeltagande_{year}{types}.xlsx')
                                               'röster_fgval']] = np.nan
         return ph
 
-    def macro_results(self, count_type="slutresultat"):
+    def macro_results(self, count_type="slutresultat", force=False):
         """Denna funktion hämtar alla valresultat på riksnivå från xml-filerna \
 för riksdata (dvs de som har namnet 00{valtyp}.xml). Valdata från dessa \
 sätts här ihop till en samlad fil för resultat på riksnivå i en fil \
-som heter 'alla_valresultat_2006_2018.xlsx' och ligger i mappen 'resultat'."""
-        
+som heter 'alla_valresultat_2006_2018.parquet' och ligger i mappen 'resultat'. \
+Hoppas över om varken riksfilerna eller alla_partier har ändrats, om \
+inte force=True."""
         
+        path_all_elecs = Path('data/resultat/alla_valresultat_2006_2018.parquet')
+
+        sources = self.national_paths(count_type) + \
+                    [Path('data/resultat/alla_partier.parquet')]
+        if not force and self.manifest.is_current('macro_results', sources,
+                                                  [path_all_elecs]):
+            return
+        fingerprint = self.manifest.fingerprint(sources)
         
             #df.to_excel('data/resultat/valresultat_riket.xlsx',index=False)
             
@@ -615,91 +1528,172 @@ som heter 'alla_valresultat_2006_2018.xlsx' och ligger i mappen 'resultat'."""
         df.loc[df.parti=='L','beteckning'] = 'Liberalerna (tidigare Folkpartiet)'
         #df = df.loc[df['parti']!='övriga_mindre_partier_totalt']
 
-        path_all_elecs = Path('data/resultat/alla_valresultat_2006_2018.xlsx')
+        write_table(df, path_all_elecs)
 
-        df.to_excel(path_all_elecs,index=False)
+        self.manifest.record('macro_results', 'macro_results', sources,
+                             [path_all_elecs], fingerprint)
+        self.manifest.save()
 
-    def muni_elec_meta_data(self, year):
+    def muni_elec_meta_data(self, year, workers=None, files=None):
         """Hämtar all metadata om kommunernas valkretsar. \
 Behövs för att ta reda på ifall kommunerna har en val-\
-spärr på 2 (1 valkrets) eller 3 procent (>1 valkrets)."""
-        
-        
-        def get_district_data(xml_data):
-            for child in ET.XML(xml_data).getchildren():
-                a_list = []
-                if child.tag == 'KOMMUN':
-                    kommun_name = child.attrib.get('NAMN')
-                    kommun_code = child.attrib.get('KOD')
-                    region_counter = \
-                    len([x for x in child.getchildren() if x.tag == 'KRETS_KOMMUN'])
+spärr på 2 (1 valkrets) eller 3 procent (>1 valkrets).
 
-                    for subchild in child:
-                        if subchild.tag == 'KRETS_KOMMUN':
-                            a_dict = {}
-                            a_dict['kommun'] = kommun_name
-                            a_dict['kommunkod'] = kommun_code
-                            a_dict['valkrets'] = subchild.attrib.get('NAMN')
-                            a_dict['antal_valkretsar'] = region_counter
-                            a_dict['antal_distrikt'] = len([child for child in subchild \
-                                                     if child.tag == 'VALDISTRIKT'])
-
-                            a_list.append(a_dict)
-
-            return pd.DataFrame(a_list)
+Kommunfilerna läses strömmande och parallellt i 'workers' \
+processer (default en per kärna). Raderna samlas i en lista och \
+görs om till en dataframe först när alla filer är lästa.
+
+Med 'files' (namnen på kommunfiler som har ändrats, t.ex. \
+'valnatt_0114K.xml') läses bara de filerna om, och deras kommuners \
+rader byts ut i den befintliga valkretsdata_{år}. Finns den inte \
+läses alla filer."""
          
         year = str(year)
-        files = os.listdir(f'data/xml_filer/val_{year}/')
-        files = [file for file in files if 'K.xml' in file \
-                 and not '00K.xml' in file]
+        path_placeholder = Path(f'data/meta_filer/valkretsdata_{year}.parquet')
+        names = [file for file in sorted(self.xml_names(year)) \
+                 if 'K.xml' in file and not '00K.xml' in file]
+
+        partial = files is not None and path_placeholder.exists()
+        if partial:
+            names = [file for file in names if file in set(files)]
+            if not names:
+                return
 
-        placeholder = pd.DataFrame(columns=['kommun',
+        a_list = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for rows in executor.map(_district_meta,
+                                     [self.xml_source(year, file) \
+                                      for file in names],
+                                     chunksize=16):
+                a_list.extend(rows)
+
+        placeholder = pd.DataFrame(a_list,
+                                   columns=['kommun',
                                             'kommunkod',
                                             'antal_valkretsar',
                                             'valkrets',
                                             'antal_distrikt'])
-        for file in files:
-            with open(f"data/xml_filer/val_{year}/{file}", encoding="ISO-8859-1") as f:
-                xml_data = f.read()
-            placeholder = pd.concat([placeholder,get_district_data(xml_data)])
+
+        if partial:
+            placeholder = replace_municipalities(read_table(path_placeholder),
+                                                 placeholder, names)
+
+        if not os.path.isdir(f'data/meta_filer'):
+            os.makedirs(f'data/meta_filer')
         
-        path_placeholder = Path(f'data/meta_filer/valkretsdata_{year}.xlsx')
-        placeholder.to_excel(path_placeholder,index=False)
+        write_table(placeholder, path_placeholder)
+
+
+    def district_path(self, year, types, table='valdistrikt'):
+        return Path(f'data/resultat/valdistrikt/{table}_{year}{types}.parquet')
+
+    def district_results(self, year, count_type="prelresultat",
+                         elec_types=['K','L','R'], workers=None,
+                         force=False, files=None):
+        """Extraherar valresultatet per valdistrikt ur kommunfilerna \
+({räkning}_{kommunkod}{valtyp}.xml), som muni_elec_meta_data() \
+annars bara räknar distrikten i. För varje valtyp sparas två \
+tabeller i data/resultat/valdistrikt/:
+
+- valdistrikt_{år}{valtyp}.parquet : röster och procent per \
+distrikt och parti
+- valdistrikt_deltagande_{år}{valtyp}.parquet : antal röster, \
+röstberättigade och valdeltagande per distrikt
+
+Kommunfilerna läses strömmande och parallellt i 'workers' processer. \
+Tabellerna sparas kolumnvis med kategorier för text och små \
+taltyper (se compact()), och en valtyp i taget byggs upp i minnet. \
+Valtyper vars kommunfiler inte har ändrats hoppas över, om inte \
+force=True.
+
+Med 'files' (namnen på kommunfiler som har ändrats) läses bara de \
+filerna om, och deras kommuners rader byts ut i de befintliga \
+tabellerna. Det görs bara när övriga kommunfiler är oförändrade \
+sedan tabellerna byggdes (se Manifest); annars läses valtypens alla \
+filer som vanligt."""
+        year = str(year)
+        prefix = count_type if year == '2018' else 'slutresultat'
 
+        if not os.path.isdir('data/resultat/valdistrikt'):
+            os.makedirs('data/resultat/valdistrikt')
 
-    def muni_data_fetcher(self,child, year, name=None, code=None):
+        names = sorted(self.xml_names(year))
+        for types in elec_types:
+            sources = [self.xml_source(year, name) for name in names \
+                       if re.fullmatch(f'{prefix}_\\d{{4}}{types}\\.xml',
+                                       name) \
+                       and not name.endswith(f'_00{types}.xml')]
+            outputs = [self.district_path(year, types),
+                       self.district_path(year, types,
+                                          'valdistrikt_deltagande')]
+            unit = f'district_results:{year}{types}'
+            if not force and self.manifest.is_current(unit, sources, outputs):
+                continue
+            fingerprint = self.manifest.fingerprint(sources)
+
+            # Path och ZipMember har båda filnamnet i 'name'
+            changed = [source for source in sources \
+                       if files is not None and source.name in files]
+            partial = bool(changed) and not force and \
+                self.manifest.is_current(unit, sources, outputs,
+                                         ignore=changed)
+
+            votes = []
+            turnout = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for v, t in executor.map(_district_results,
+                                         changed if partial else sources,
+                                         chunksize=16):
+                    votes.append(v.to_frame())
+                    turnout.append(t.to_frame())
+
+            for frames, path in zip([votes, turnout], outputs):
+                if frames:
+                    df = pd.concat(frames, ignore_index=True)
+                else:
+                    df = ColumnBuffer(DISTRICT_COLUMNS if path == outputs[0] \
+                                      else DISTRICT_PARTICIP_COLUMNS).to_frame()
+                if partial:
+                    df = replace_municipalities(pd.read_parquet(path), df,
+                                                [source.name for source \
+                                                 in changed])
+                compact(df).to_parquet(path, index=False)
+
+            self.manifest.record(unit, 'district_results', sources, outputs,
+                                 fingerprint)
+        self.manifest.save()
+
+    def muni_data_fetcher(self, buffer, child, year, name=None, code=None):
         """Den här funktionen används att sammanställa \
 all valdata från xml-filerna till sammansatta \
 resultatsfiler. Dessa sparas i mappen 'resultat'. \
-Denna funktion används i huvudfunktionen fast_elec_calc()."""
-        
+Denna funktion används i huvudfunktionen fast_elec_calc(). \
+Raden läggs till i 'buffer' (en ColumnBuffer) och alla tal \
+tolkas direkt."""
         
-        a_dict = {}
-        if name:
-            a_dict['kommun'] = name
-            a_dict['kommunkod'] = code
-
         if child.tag == 'ÖVRIGA_GILTIGA':
-            a_dict['parti'] = 'övriga_mindre_partier_totalt'
+            parti = 'övriga_mindre_partier_totalt'
         elif child.tag == 'OGILTIGA':
             if child.attrib.get('TEXT'):
-                a_dict['parti'] = child.attrib.get('TEXT')
+                parti = child.attrib.get('TEXT')
             else:
-                a_dict['parti'] = 'ogiltiga'
+                parti = 'ogiltiga'
         else:
-            a_dict['parti'] = child.attrib.get('PARTI')
-        #a_dict['parti'] = child.attrib.get('PARTI')
-        a_dict['mandat'] = child.attrib.get('MANDAT')
-        #print('1. ',a_dict['parti'])
-        #print('2. ',a_dict['mandat'])
-        a_dict['mandat_fgval'] = child.attrib.get('MANDAT_FGVAL')
-        a_dict['röster'] = child.attrib.get('RÖSTER')
-        a_dict['röster_fgval'] = child.attrib.get('RÖSTER_FGVAL')
-        a_dict['procent'] = child.attrib.get('PROCENT')
-        a_dict['procent_fgval'] = child.attrib.get('PROCENT_FGVAL')
-        #a_list.append(a_dict)
+            parti = child.attrib.get('PARTI')
+
+        values = [parti,
+                  child.attrib.get('MANDAT'),
+                  child.attrib.get('MANDAT_FGVAL'),
+                  child.attrib.get('RÖSTER'),
+                  child.attrib.get('RÖSTER_FGVAL'),
+                  child.attrib.get('PROCENT'),
+                  child.attrib.get('PROCENT_FGVAL')]
+        # kommunradernas buffert har även kommun och kommunkod, även
+        # när NAMN saknas i xml-filen
+        if 'kommun' in buffer.columns:
+            values = [name, code] + values
 
-        return a_dict
+        buffer.append(*values)
 
 
     def gotland_adder(self,df,year):
@@ -712,8 +1706,8 @@ sedan valde att inte räkna Gotland bland landstingen.
 """
         if year == '2006':
             path_2010 = Path(f'data/resultat/resultat_2010/\
-valresultat_2010K.xlsx')
-            data = pd.read_excel(path_2010)
+valresultat_2010K.parquet')
+            data = read_table(path_2010)
             data = data.loc[:,['kommun',
                                 'kommunkod',
                                 'mandat_fgval',
@@ -726,8 +1720,8 @@ valresultat_2010K.xlsx')
             })
         else:
             path = Path(f'data/resultat/resultat_{year}/\
-valresultat_{year}K.xlsx')
-            data = pd.read_excel(path)
+valresultat_{year}K.parquet')
+            data = read_table(path)
         data = data.loc[data['kommun']=='Gotland']
         return pd.concat([df,data])
 
@@ -739,43 +1733,134 @@ men dess siffror är textsträngar där komma skrivs \
 med ett kommatecken, inte punkt - som är standard \
 för python. Därför måste dessa omformas med denna \
 funktion."""
-        return series.str.replace(',','.')\
-                    .convert_objects(convert_numeric=True)
+        return pd.to_numeric(series.astype(str).str.replace(',','.'),
+                             errors='coerce')
 
 
     
 
 
-    def valdeltagande(self,name,code,nr_mandat,child):
+    def valdeltagande(self,buffer,name,code,nr_mandat,child):
         """Samma typ av funktion som muni_data_fetcher() ovan, \
     då den används i huvudfunktionen fast_particip_calc() \
-    för att organisera valdata i en dictionary."""
-        a_dict = {}
-        a_dict['kommun'] = name
-        a_dict['kommunkod'] = code
-        a_dict['summa_mandat'] = nr_mandat
-        a_dict['summa_röster'] = child.attrib.get('SUMMA_RÖSTER')
-        a_dict['summa_röster_fgval'] = \
-                    child.attrib.get('SUMMA_RÖSTER_FGVAL')
-        
-        a_dict['summa_röstberättigade'] = \
-                    child.attrib.get('RÖSTBERÄTTIGADE_KLARA_VALDISTRIKT')
-        
-        a_dict['summa_röstberättigade_fgval'] = \
-                    child.attrib.get('RÖSTBERÄTTIGADE_KLARA_VALDISTRIKT_FGVAL')
-        
-        a_dict['valdeltagande'] = child.attrib.get('PROCENT')
-        a_dict['valdeltagande_fgval'] = child.attrib.get('PROCENT_FGVAL')
-        return a_dict
-
-    
-
-
-    
+    för att lägga till valdeltagandet i 'buffer'."""
+        buffer.append(name,
+                      code,
+                      nr_mandat,
+                      child.attrib.get('SUMMA_RÖSTER'),
+                      child.attrib.get('SUMMA_RÖSTER_FGVAL'),
+                      child.attrib.get('RÖSTBERÄTTIGADE_KLARA_VALDISTRIKT'),
+                      child.attrib.get('RÖSTBERÄTTIGADE_KLARA_VALDISTRIKT_FGVAL'),
+                      child.attrib.get('PROCENT'),
+                      child.attrib.get('PROCENT_FGVAL'))
+
+
+def _extract_unit(year, types, count_type, archives=None):
+    """Arbetsfunktion till ExtractData.parallel_extract(). Läser en \
+riksfil, sparar valresultat och valdeltagande och återger det \
+extraherade datat så att huvudprocessen kan återanvända det."""
+    E = ExtractData(archives)
+    extract = E.extract_file(year, types, count_type)
+    E.write_results(year, types, extract)
+    E.write_particip(year, types, extract)
+    [key] = E.extracts
+    return key, extract
+
+
+def _district_meta(source):
+    """Arbetsfunktion till ExtractData.muni_elec_meta_data(). Läser \
+en kommunfil strömmande och återger en rad per valkrets med antal \
+valkretsar i kommunen och antal valdistrikt i valkretsen."""
+    parser = ET.XMLParser(encoding="ISO-8859-1")
+    a_list = []
+    kommun_name = kommun_code = None
+    kommun_rows = []
+    with open_xml(source) as f:
+        for event, elem in ET.iterparse(f, events=('start','end'),
+                                        parser=parser):
+            if event == 'start':
+                if elem.tag == 'KOMMUN':
+                    kommun_name = elem.attrib.get('NAMN')
+                    kommun_code = elem.attrib.get('KOD')
+                    kommun_rows = []
+                continue
 
+            if elem.tag == 'KRETS_KOMMUN':
+                a_dict = {}
+                a_dict['kommun'] = kommun_name
+                a_dict['kommunkod'] = kommun_code
+                a_dict['valkrets'] = elem.attrib.get('NAMN')
+                a_dict['antal_distrikt'] = len([x for x in elem \
+                                                if x.tag == 'VALDISTRIKT'])
+                kommun_rows.append(a_dict)
+                elem.clear()
+
+            elif elem.tag == 'KOMMUN':
+                for a_dict in kommun_rows:
+                    a_dict['antal_valkretsar'] = len(kommun_rows)
+                a_list.extend(kommun_rows)
+                kommun_rows = []
+                elem.clear()
+
+    return a_list
+
+
+def _district_results(source):
+    """Arbetsfunktion till ExtractData.district_results(). Läser en \
+kommunfil strömmande och återger två ColumnBuffer: röster per \
+valdistrikt och parti, samt valdeltagandet per valdistrikt."""
+    parser = ET.XMLParser(encoding="ISO-8859-1")
+    votes = ColumnBuffer(DISTRICT_COLUMNS)
+    turnout = ColumnBuffer(DISTRICT_PARTICIP_COLUMNS)
+
+    kommun_name = kommun_code = valkrets = None
+    with open_xml(source) as f:
+        for event, elem in ET.iterparse(f, events=('start','end'),
+                                        parser=parser):
+            if event == 'start':
+                if elem.tag == 'KOMMUN':
+                    kommun_name = elem.attrib.get('NAMN')
+                    kommun_code = elem.attrib.get('KOD')
+                elif elem.tag == 'KRETS_KOMMUN':
+                    valkrets = elem.attrib.get('NAMN')
+                continue
 
+            if elem.tag == 'VALDISTRIKT':
+                code = elem.attrib.get('KOD')
 
-    
+                parties = [x for x in elem if x.tag in ['GILTIGA',
+                                                        'OGILTIGA']]
+                for subchild in elem:
+                    if subchild.tag == 'ÖVRIGA_GILTIGA':
+                        parties.extend(x for x in subchild \
+                                       if x.tag == 'GILTIGA')
 
-    
+                for x in parties:
+                    if x.tag == 'OGILTIGA':
+                        parti = x.attrib.get('TEXT') or 'ogiltiga'
+                    else:
+                        parti = x.attrib.get('PARTI')
+                    votes.append(kommun_code,
+                                 code,
+                                 parti,
+                                 x.attrib.get('RÖSTER'),
+                                 x.attrib.get('PROCENT'))
+
+                deltagande = [x for x in elem if x.tag == 'VALDELTAGANDE']
+                attrib = deltagande[0].attrib if deltagande else elem.attrib
+                turnout.append(kommun_name,
+                               kommun_code,
+                               valkrets,
+                               elem.attrib.get('NAMN'),
+                               code,
+                               attrib.get('SUMMA_RÖSTER'),
+                               attrib.get('RÖSTBERÄTTIGADE') or \
+                               attrib.get('RÖSTBERÄTTIGADE_KLARA_VALDISTRIKT'),
+                               attrib.get('PROCENT'))
+                elem.clear()
+
+            elif elem.tag in ['KRETS_KOMMUN','KOMMUN']:
+                elem.clear()
+
+    return votes, turnout
 
@@ -0,0 +1,145 @@
+"""Test av poll_election_night() mot en lokal http-server som \
+serverar en liten zip-fil. Extraktionen byts ut mot attrapper, så \
+testet kontrollerar bara vad som körs om efter varje hämtning."""
+import functools
+import http.server
+import os
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+import startup_tools as st
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, 'w') as file:
+        for name, text in members.items():
+            file.writestr(name, text)
+
+
+class PollElectionNightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+
+        # serverns mapp har samma upplägg som data.val.se
+        self.served = root / 'server' / 'val2018' / 'valnatt' / 'valnatt.zip'
+        self.served.parent.mkdir(parents=True)
+        self.members = {'valnatt_00K.xml':'<VAL/>',
+                        'valnatt_00L.xml':'<VAL/>',
+                        'valnatt_00R.xml':'<VAL/>',
+                        'valnatt_0114K.xml':'<VAL/>',
+                        'valnatt_0114L.xml':'<VAL/>'}
+        write_zip(self.served, self.members)
+
+        handler = functools.partial(QuietHandler,
+                                    directory=str(root / 'server'))
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      handler)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+        # arbetsmappen med data/, där distriktstabellen för K redan finns
+        work = root / 'arbete'
+        (work / 'data' / 'xml_filer').mkdir(parents=True)
+        (work / 'data' / 'resultat' / 'valdistrikt').mkdir(parents=True)
+        (work / 'data' / 'resultat' / 'valdistrikt' /
+         'valdistrikt_2018K.parquet').touch()
+        os.chdir(work)
+
+        self.calls = {}
+        for name in ['fast_elec_calc', 'fast_particip_calc', 'all_parties',
+                     'macro_results', 'muni_elec_meta_data',
+                     'district_results']:
+            patcher = mock.patch.object(st.ExtractData, name, autospec=True)
+            self.calls[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.tmp.cleanup()
+
+    def change_members(self, summary):
+        """on_refresh: ändrar en riksfil och en kommunfil efter \
+första hämtningen, och gör den andra uppdateringen långsam."""
+        if summary['hämtning'] == 1:
+            self.members['valnatt_00L.xml'] = '<VAL RÄKNING="2"/>'
+            self.members['valnatt_0114K.xml'] = '<VAL RÄKNING="2"/>'
+            write_zip(self.served, self.members)
+            # If-Modified-Since räknar hela sekunder
+            later = time.time() + 10
+            os.utime(self.served, (later, later))
+        else:
+            time.sleep(0.6)
+
+    def test_only_changed_members_are_refreshed(self):
+        with self.assertWarns(st.LatencyWarning):
+            history = st.poll_election_night(base_url=self.base_url,
+                                             interval=0,
+                                             latency_budget=0.5,
+                                             max_polls=3,
+                                             on_refresh=self.change_members)
+
+        first, second, third = history
+
+        self.assertTrue(first['ändrad'])
+        self.assertEqual(first['valtyper'], ['K', 'L', 'R'])
+        self.assertEqual(first['kommuner'], ['0114'])
+        self.assertFalse(first['över_budget'])
+        self.assertIsNone(first['fel'])
+
+        self.assertTrue(second['ändrad'])
+        self.assertEqual(second['valtyper'], ['L'])
+        self.assertEqual(second['kommuner'], ['0114'])
+        self.assertTrue(second['över_budget'])
+        self.assertIsNone(second['fel'])
+
+        self.assertFalse(third['ändrad'])
+        self.assertEqual(third['valtyper'], [])
+        self.assertEqual(third['kommuner'], [])
+        self.assertFalse(third['över_budget'])
+
+        # andra hämtningen kör bara om valtypen och kommunen som ändrats
+        _, kwargs = self.calls['fast_elec_calc'].call_args
+        self.assertEqual(kwargs['elec_types'], ['L'])
+        _, kwargs = self.calls['fast_particip_calc'].call_args
+        self.assertEqual(kwargs['elec_types'], ['L'])
+        _, kwargs = self.calls['muni_elec_meta_data'].call_args
+        self.assertEqual(kwargs['files'], ['valnatt_0114K.xml'])
+        _, kwargs = self.calls['district_results'].call_args
+        self.assertEqual(kwargs['elec_types'], ['K'])
+        self.assertEqual(kwargs['files'], ['valnatt_0114K.xml'])
+
+        self.assertEqual(self.calls['fast_elec_calc'].call_count, 2)
+        self.assertEqual(self.calls['muni_elec_meta_data'].call_count, 2)
+
+    def test_errors_are_recorded_and_retried(self):
+        self.served.unlink()
+        history = st.poll_election_night(base_url=self.base_url,
+                                         interval=0,
+                                         max_polls=2)
+
+        for summary in history:
+            self.assertIn('HTTPError', summary['fel'])
+            self.assertFalse(summary['ändrad'])
+        self.calls['fast_elec_calc'].assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
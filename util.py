@@ -1,8 +1,16 @@
 import pandas as pd
+import numpy as np
 import os
-import requests
+import json
+import sqlite3
+import inspect
+import functools
+import contextlib
 import warnings
+from collections import OrderedDict
+from collections.abc import Mapping
 from pathlib import Path
+from startup_tools import read_table, Manifest
 warnings.filterwarnings("ignore")
 
 
@@ -16,7 +24,7 @@ def gov_mandates(year):
     path_styren = Path('data/styren_2006_2014_formatted.xlsx')
 
     # hämta valdata
-    styren = pd.read_excel(path_styren)
+    styren = load_table(path_styren)
     
     # se till att alla block är i stora bokstäver
     styren.block = styren.block.str.upper().str.strip()
@@ -89,7 +97,7 @@ def gov_mandates(year):
                     .reset_index(drop=True)
     
     # gruppera valdata efter kommun och block och återge
-    ph = partier.groupby(['kommun','block']).sum().reset_index()
+    ph = partier.groupby(['kommun','block'],observed=True).sum(numeric_only=True).reset_index()
     
     ph=ph.merge(df.loc[:,['kommun','summa_mandat']].drop_duplicates(),on='kommun',how='left')
 
@@ -181,11 +189,11 @@ Resultatet blir den valdata som hämtas i mappen 'resultat'. Default \
                    f'procent_{elec_year}',
                    f'mandat_{elec_year}']]\
             .groupby(['kommun',
-                      'block']).sum().reset_index()
+                      'block'],observed=True).sum(numeric_only=True).reset_index()
     
     # Vi vill också se hur stor mandatminskningen är inom blocken
     # Här bryter vi ur den infon i en ny df som används längre ned
-    df2 = muni_govs.groupby(['block']).sum()
+    df2 = muni_govs.groupby(['block'],observed=True).sum(numeric_only=True)
     
     # Här räknar vi ut hur stor miskningen/ökningen är per blockstyre
     # i procent:
@@ -241,7 +249,12 @@ Resultatet blir den valdata som hämtas i mappen 'resultat'. Default \
         return df
     
     
-    results = df.groupby(['kommun','block']).sum().reset_index().set_index('kommun')
+    # summa_mandat är heltal och skulle annars summeras med, de
+    # läggs till per kommun nedan:
+    results = df.drop(columns=[f'summa_mandat_{elec_year}',
+                               f'summa_mandat_{compare_year}'],
+                      errors='ignore')\
+                .groupby(['kommun','block'],observed=True).sum(numeric_only=True).reset_index().set_index('kommun')
     
     results = results.merge(valdata.loc[:,['kommun',
                                            f'summa_mandat_{elec_year}']]\
@@ -319,7 +332,12 @@ def reshape_particip(df):
     return df
 
 def comma_remover(series):
-    return series.str.replace(',','.').astype('float')
+    """Gör om decimaltal skrivna med kommatecken till float. \
+Resultatfilerna från ExtractData har redan numeriska kolumner, \
+men äldre filer kan ha decimalerna som text."""
+    if series.dtype == object:
+        series = series.astype(str).str.replace(',','.')
+    return pd.to_numeric(series, errors='coerce')
 
 
 
@@ -327,7 +345,7 @@ def all_mandates_2006(df):
     """Beräknar mandatsumma för 2006."""
     df1 = df.loc[df['valår']==2006]
     
-    all_mandates = df1.groupby('kommun').sum().reset_index()\
+    all_mandates = df1.groupby('kommun',observed=True).sum(numeric_only=True).reset_index()\
                         .loc[:,['kommun',
                                 'mandat']]\
                         .rename(columns={'mandat':'mandat_2006'})
@@ -349,8 +367,7 @@ def reshape(df):
                    'mandat_fgval',
                    'parti',
                    'procent_fgval',
-                   'röster_fgval',
-                   'valår']]
+                   'röster_fgval']]
     
     df.rename(columns={
         'mandat_fgval':'mandat',
@@ -379,7 +396,7 @@ def majority_calc(df, operator='mandat'):
 
     df.loc[df['block'].isnull(),'block'] = 'Ö'
     
-    df=df.groupby(['kommun','valår','block']).sum().reset_index()
+    df=df.groupby(['kommun','valår','block'],observed=True).sum(numeric_only=True).reset_index()
     
     del df['summa_mandat']
     
@@ -413,25 +430,110 @@ def majority_calc(df, operator='mandat'):
                          2:'övriga'})
 
 def all_particip_years(val):
-    path_2010 = Path(f'data/meta_filer/\
-valdeltagande/valdeltagande_2010{val}.xlsx')
-
-    df = pd.DataFrame(columns=pd.read_excel(path_2010).columns)
-    for year in ['2006','2010','2014','2018']:
-        if year == '2006':
-            data = pd.read_excel(path_2010)
-            data = reshape_particip(data)
-        else:
-            path = Path(f'data/meta_filer/valdeltagande/valdeltagande_{year}{val}.xlsx')
-            data = pd.read_excel(path)
-    
-        data['valår'] = int(year)
-        df = pd.concat([df,data])
-        
-    return df.loc[:,['kommun','valår','summa_röster','valdeltagande','summa_mandat']]
+    """Valdeltagandet i kommunerna för alla val åren 2006-2018. \
+Hämtas ur valdatabasen om den är byggd från de nuvarande \
+filerna, se build_election_store()."""
+    if store_is_current(val):
+        return query_store('valdeltagande',
+                           columns=['kommun','valår','summa_röster',
+                                    'valdeltagande','summa_mandat'],
+                           valtyp=val)
+    return _assemble_particip_years(val).loc[:,['kommun',
+                                                'valår',
+                                                'summa_röster',
+                                                'valdeltagande',
+                                                'summa_mandat']]
+
+
+def _assemble_particip_years(val):
+    """Sätter ihop all_particip_years() från filerna. Varje fil \
+läses en gång; 2006 hämtas ur _fgval-kolumnerna i 2010 års fil."""
+    files = {year:load_table(Path(f'data/meta_filer/valdeltagande/\
+valdeltagande_{year}{val}.parquet')) for year in ['2010','2014','2018']}
+
+    frames = [reshape_particip(files['2010']).assign(valår=2006)] + \
+             [files[year].assign(valår=int(year)) for year in files]
+    df = pd.concat(frames, ignore_index=True)
+
+    return df.loc[:,['kommun','kommunkod','valår','summa_röster','valdeltagande','summa_mandat']]
+
+
+# Datatyperna i all_elec_years(). Kommun och parti är kategorier;
+# 'Övr' och 'övriga' finns med som kategorier eftersom flera
+# funktioner slår ihop de mindre partierna under de namnen.
+ELEC_YEARS_DTYPES = {'kommun':'category',
+                     'valår':'int16',
+                     'parti':'category',
+                     'röster':'Int32',
+                     'summa_röster':'Int32',
+                     'procent':'float64',
+                     'mandat':'Int16',
+                     'summa_mandat':'Int16'}
+
+EXTRA_PARTIES = ['Övr','övriga']
+
+
+def elec_years_schema(df,report=False):
+    """Ger all_elec_years() dess datatyper, se ELEC_YEARS_DTYPES. \
+Minnesåtgången före och efter sparas i df.attrs['minne'] (i byte).
+
+PARAMETRAR
+----------
+df : dataframe med kolumnerna i ELEC_YEARS_DTYPES
+report : True skriver ut hur mycket minne som sparades"""
+    before = df.memory_usage(deep=True).sum()
+
+    df = df.astype(ELEC_YEARS_DTYPES)
+    df['parti'] = df['parti'].cat.add_categories(
+        [parti for parti in EXTRA_PARTIES \
+         if parti not in df['parti'].cat.categories])
+
+    after = df.memory_usage(deep=True).sum()
+    df.attrs['minne'] = {'före':int(before),'efter':int(after)}
+    if report:
+        memory_report(df)
+    return df
+
+
+def memory_report(df):
+    """Skriver ut minnesbesparingen som elec_years_schema() \
+sparade i df.attrs."""
+    before = df.attrs['minne']['före']
+    after = df.attrs['minne']['efter']
+    print(f'all_elec_years: {before/1e6:.2f} MB -> {after/1e6:.2f} MB '
+          f'({(1-after/before)*100:.0f} % mindre)')
+
+
+# Cache för all_elec_years(). Nyckeln är valtypen, exclude och
+# storlek och ändringstid för filerna tabellen byggs av, så en ny
+# körning av ExtractData eller build_election_store() ger en ny nyckel.
+
+ELEC_YEARS_CACHE_SIZE = 8
 
+_elec_years_cache = OrderedDict()
 
-def all_elec_years(val,exclude=True):
+
+def file_fingerprint(paths):
+    """Sökväg, storlek och ändringstid för varje fil i 'paths'. \
+Filer som saknas får storlek och ändringstid None."""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            fingerprint.append((str(path), None, None))
+            continue
+        fingerprint.append((str(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def clear_cache():
+    """Tömmer cacharna för all_elec_years() och national_totals()."""
+    _elec_years_cache.clear()
+    _national_cache.clear()
+
+
+def all_elec_years(val,exclude=True,report=False):
     """Denn funktion formatterar om alla grundfiler \
 med respektive års valdata till en enhetlig och korrekt \
 formatterad totallista för alla önskat val åren 2006-2018.
@@ -445,30 +547,80 @@ vilket denna funktion fixar
 (det kan nämligen vara så att somliga kommuner haft omval, denna \
 funktion säkerställer att rätt jämförbart valresultat är med \
 för alla kommuner).
+
+Finns valdatabasen (se build_election_store()) och är den byggd från \
+de nuvarande resultatfilerna hämtas tabellen därifrån i stället.
+
+Kolumnerna har fasta datatyper, se elec_years_schema(). report=True \
+skriver ut hur mycket minne det sparar.
+
+Tabellen sparas i en cache (högst ELEC_YEARS_CACHE_SIZE tabeller) så \
+att upprepade anrop inte läser om filerna. Cachen gäller så länge \
+resultatfilerna och valdatabasen är oförändrade och töms med \
+clear_cache(). Varje anrop får en egen kopia av tabellen.
+
+Inom en ElectionSession hämtas tabellen från sessionen.
 """
-    path_2010 = Path(f'data/resultat/\
-resultat_2010/valresultat_2010{val}.xlsx')
-    df = pd.DataFrame(columns=pd.read_excel(path_2010).columns)
-    for year in ['2006','2010','2014','2018']:
-        if year == '2006':
-            data = pd.read_excel(path_2010)
-            data = reshape(data)
-            data['procent'] = comma_remover(data['procent'])
-        else:
-            path = Path(f'data/resultat/resultat_{year}/valresultat_{year}{val}.xlsx')
-            data = pd.read_excel(path)
-            if (year == '2010') or (year == '2014'):
-                data = old_data_reshaper(data,year,val)
-            for col in ['procent','procent_fgval']:
-                data[col] = comma_remover(data[col])
-    
-        data['valår'] = int(year)
-        df = pd.concat([df,data])
+    session = active_session()
+    if session is not None:
+        return session.all_elec_years(val,exclude,report)
+    return _load_elec_years(val,exclude,report)
+
+
+def _load_elec_years(val,exclude=True,report=False):
+    """all_elec_years() utan session: från cachen, valdatabasen \
+eller resultatfilerna."""
+    key = (val, exclude, file_fingerprint(store_sources(val) + [STORE_PATH]))
+    if key in _elec_years_cache:
+        _elec_years_cache.move_to_end(key)
+        df = _elec_years_cache[key]
+        if report:
+            memory_report(df)
+        return df.copy()
+
+    columns = ['kommun','valår','parti','röster','summa_röster','procent','mandat','summa_mandat']
+    if store_is_current(val):
+        df = query_store('valresultat', columns=columns, valtyp=val)
         if exclude:
-            df = df.loc[df['parti']!='övriga_mindre_partier_totalt']
+            df = df.loc[df['parti']!='övriga_mindre_partier_totalt']\
+                    .reset_index(drop=True)
+    else:
+        df = _assemble_elec_years(val,exclude).loc[:,columns]
+    df = elec_years_schema(df,report)
+
+    _elec_years_cache[key] = df
+    while len(_elec_years_cache) > ELEC_YEARS_CACHE_SIZE:
+        _elec_years_cache.popitem(last=False)
+    return df.copy()
+
+
+def _assemble_elec_years(val,exclude=True):
+    """Sätter ihop all_elec_years() från resultatfilerna. Återger \
+också kommunkoderna.
+
+Varje resultatfil läses en gång. 2006 hämtas ur _fgval-kolumnerna \
+i 2010 års fil och 2010 och 2014 ur nästföljande års fil (se \
+old_data_reshaper()), från de tabeller som redan är inlästa. Åren \
+läggs ihop med en enda concat."""
+    files = {year:load_table(Path(f'data/resultat/resultat_{year}/\
+valresultat_{year}{val}.parquet')) for year in ['2010','2014','2018']}
+    for data in files.values():
+        for col in ['procent','procent_fgval']:
+            data[col] = comma_remover(data[col])
+
+    frames = [reshape(files['2010']).assign(valår=2006)]
+    for year in ['2010','2014']:
+        data = old_data_reshaper(files[year],year,val,
+                                 new_data=files[str(int(year)+4)])
+        frames.append(data.assign(valår=int(year)))
+    frames.append(files['2018'].assign(valår=2018))
+
+    df = pd.concat(frames, ignore_index=True)
+    if exclude:
+        df = df.loc[df['parti']!='övriga_mindre_partier_totalt']
         
     # slutligen, lägg till totala röster och mandat i kommunerna:
-    munis_meta = all_particip_years(val)
+    munis_meta = _assemble_particip_years(val)
     #munis_meta.valår = munis_meta.valår.astype('str')
     munis_meta = munis_meta.loc[:,['kommun','valår','summa_röster','summa_mandat']]
 
@@ -478,26 +630,419 @@ resultat_2010/valresultat_2010{val}.xlsx')
     df.valår = df.valår.astype('int')
     if val == 'K':
         df = all_mandates_2006(df)
-    return df.loc[:,['kommun','valår','parti','röster','summa_röster','procent','mandat','summa_mandat']]
+    return df.loc[:,['kommun','kommunkod','valår','parti','röster','summa_röster','procent','mandat','summa_mandat']]
+
+
+# Valdatabasen: alla val i en sqlite-fil med ett gemensamt schema,
+# en rad per (valår, valtyp, kommunkod, parti).
+
+STORE_PATH = Path('data/valdata.sqlite')
+
+STORE_SCHEMA = {
+    'valresultat':{'valår':'INTEGER',
+                   'valtyp':'TEXT',
+                   'kommunkod':'TEXT',
+                   'kommun':'TEXT',
+                   'parti':'TEXT',
+                   'röster':'INTEGER',
+                   'summa_röster':'INTEGER',
+                   'procent':'REAL',
+                   'mandat':'INTEGER',
+                   'summa_mandat':'INTEGER'},
+    'valdeltagande':{'valår':'INTEGER',
+                     'valtyp':'TEXT',
+                     'kommunkod':'TEXT',
+                     'kommun':'TEXT',
+                     'summa_röster':'INTEGER',
+                     'valdeltagande':'REAL',
+                     'summa_mandat':'INTEGER'},
+    'riket':{'valår':'INTEGER',
+             'valtyp':'TEXT',
+             'parti':'TEXT',
+             'beteckning':'TEXT',
+             'röster':'INTEGER',
+             'procent':'REAL',
+             'mandat':'INTEGER'}}
+
+STORE_INDEXES = ['valår','valtyp','kommunkod','parti']
+
+
+def store_sources(val):
+    """Filerna som valdatabasen byggs från, per valtyp. För \
+riksresultaten anges val='riket'."""
+    if val == 'riket':
+        return [Path('data/resultat/alla_valresultat_2006_2018.parquet')]
+    return [Path(f'data/resultat/resultat_{year}/valresultat_{year}{val}.parquet') \
+            for year in ['2010','2014','2018']] + \
+           [Path(f'data/meta_filer/valdeltagande/valdeltagande_{year}{val}.parquet') \
+            for year in ['2010','2014','2018']]
+
+
+def store_is_current(val):
+    """True om valdatabasen finns och är byggd från de nuvarande \
+filerna för valtypen 'val'."""
+    if not STORE_PATH.exists():
+        return False
+    return Manifest().is_current(f'election_store:{val}',
+                                 store_sources(val),
+                                 [STORE_PATH])
+
+
+def build_election_store(elec_types=['K','L','R'],national=True,force=False):
+    """Bygger valdatabasen data/valdata.sqlite av resultatfilerna \
+från ExtractData. Alla år och valtyper får samma schema (se \
+STORE_SCHEMA): 2006 och _fgval-kolumnerna är redan omräknade \
+precis som i all_elec_years(), och riksresultaten ligger i samma \
+databas. Tabellerna har index på valår, valtyp, kommunkod och parti \
+så att query_store() bara läser de rader som efterfrågas.
+
+Valtyper vars filer inte har ändrats sedan förra bygget hoppas \
+över, om inte force=True.
+
+PARAMETRAR
+----------
+elec_types : valtyperna som ska läggas in
+national : True lägger också in riksresultaten
+force : True bygger om även oförändrade valtyper"""
+    if not os.path.isdir(STORE_PATH.parent):
+        os.makedirs(STORE_PATH.parent)
+
+    manifest = Manifest()
+    units = list(elec_types) + (['riket'] if national else [])
+    # fingeravtrycken tas innan källfilerna läses, se Manifest.fingerprint()
+    fingerprints = {val:manifest.fingerprint(store_sources(val)) \
+                    for val in units}
+
+    # closing() stänger anslutningen, det andra with-blocket gör
+    # commit (eller rollback vid fel)
+    with contextlib.closing(sqlite3.connect(STORE_PATH)) as con, con:
+        for table, columns in STORE_SCHEMA.items():
+            con.execute(f'CREATE TABLE IF NOT EXISTS {table} (' + \
+                        ', '.join(f'"{col}" {kind}' \
+                                  for col, kind in columns.items()) + ')')
+            for col in STORE_INDEXES:
+                if col in columns:
+                    con.execute(f'CREATE INDEX IF NOT EXISTS '
+                                f'"{table}_{col}" ON {table} ("{col}")')
+
+        for val in units:
+            sources = store_sources(val)
+            if not force and manifest.is_current(f'election_store:{val}',
+                                                 sources, [STORE_PATH]):
+                continue
+
+            if val == 'riket':
+                df = read_table(sources[0])
+                df['valår'] = df['val'].str[:4].astype('int')
+                df['valtyp'] = df['val'].str[4:]
+                con.execute('DELETE FROM riket')
+                df.loc[:,list(STORE_SCHEMA['riket'])]\
+                    .to_sql('riket', con, if_exists='append', index=False)
+                continue
+
+            tables = {'valresultat':_assemble_elec_years(val,exclude=False),
+                      'valdeltagande':_assemble_particip_years(val)}
+            for table, df in tables.items():
+                df['valtyp'] = val
+                con.execute(f'DELETE FROM {table} WHERE valtyp = ?', (val,))
+                df.loc[:,list(STORE_SCHEMA[table])]\
+                    .to_sql(table, con, if_exists='append', index=False)
+
+        con.execute('ANALYZE')
+
+    # databasfilen ändras varje gång en valtyp byggs, så alla
+    # valtypernas fingeravtryck sparas om efter bygget
+    for val in units:
+        manifest.record(f'election_store:{val}', 'build_election_store',
+                        store_sources(val), [STORE_PATH], fingerprints[val])
+    manifest.save()
+
+
+def query_store(table,columns=None,**filters):
+    """Hämtar en del av en tabell ur valdatabasen, se \
+build_election_store().
+
+PARAMETRAR
+----------
+table : 'valresultat', 'valdeltagande' eller 'riket'
+columns : lista med kolumner, default alla
+filters : kolumn=värde, eller kolumn=[värden], t.ex. \
+query_store('valresultat', valtyp='K', valår=[2014,2018], parti='SD')"""
+    schema = STORE_SCHEMA[table]
+    if columns is None:
+        columns = list(schema)
+
+    where = []
+    params = []
+    for col, value in filters.items():
+        if col not in schema:
+            raise KeyError(f'{col} finns inte i {table}')
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+            where.append(f'"{col}" IN (' + ', '.join('?'*len(value)) + ')')
+            params.extend(value)
+        else:
+            where.append(f'"{col}" = ?')
+            params.append(value)
+
+    sql = 'SELECT ' + ', '.join(f'"{col}"' for col in columns) + \
+          f' FROM {table}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+
+    with contextlib.closing(sqlite3.connect(STORE_PATH)) as con:
+        df = pd.read_sql_query(sql, con, params=params)
+
+    # sqlite har inga heltal med saknade värden
+    for col in columns:
+        if schema[col] == 'INTEGER' and col != 'valår':
+            df[col] = df[col].astype('Int64')
+    return df
+
+
+# Partiregistret: partibeteckningarna i alla_partier, inlästa en gång
+# per process och sedan uppslagna i minnet.
+
+PARTIES_PATH = Path('data/resultat/alla_partier.parquet')
+
+_party_registry = {}
+
+
+class PartyRegistry:
+    """Partibeteckningarna ur alla_partier. Slå upp en beteckning \
+med registry.beteckning(2018, 'K', 'SD'), eller lägg till \
+beteckningarna till en hel tabell med registry.join(df, 2018, 'K'). \
+Hämta registret med party_registry(), som bara läser filen en gång."""
+
+    def __init__(self, path=PARTIES_PATH):
+        self.frame = read_table(path).loc[:,['val','parti','beteckning']]
+        self.lookup = {(int(val[:4]), val[4:], parti):beteckning \
+                       for val, parti, beteckning \
+                       in self.frame.itertuples(index=False)}
+        self.tables = {}
+
+    def beteckning(self, elec_year, elec_type, party, default=None):
+        """Beteckningen för ett parti i ett val."""
+        return self.lookup.get((int(elec_year), elec_type, party), default)
+
+    def table(self, elec_year, elec_type, upper=False):
+        """Kolumnerna parti och beteckning för ett val. Med \
+upper=True skrivs partiförkortningarna med versaler."""
+        key = (int(elec_year), elec_type, upper)
+        if key not in self.tables:
+            table = self.frame.loc[self.frame['val']==f'{elec_year}{elec_type}',
+                                   ['parti','beteckning']]
+            if upper:
+                table = table.assign(parti=table.parti.str.upper())
+            self.tables[key] = table.reset_index(drop=True)
+        return self.tables[key]
+
+    def join(self, df, elec_year, elec_type, upper=False):
+        """Lägger till kolumnen beteckning i 'df' (vänster-join på \
+parti)."""
+        return df.merge(self.table(elec_year, elec_type, upper),
+                        on='parti',
+                        how='left')
+
 
-def old_data_reshaper(df,year,elec_type):
+def party_registry():
+    """Partiregistret. Läses in första gången och igen bara om \
+alla_partier har skrivits om."""
+    key = file_fingerprint([PARTIES_PATH])
+    if key not in _party_registry:
+        _party_registry.clear()
+        _party_registry[key] = PartyRegistry()
+    return _party_registry[key]
+
+
+# Valkuben: röster, procent och mandat som täta numpy-matriser med
+# axlarna (kommun, parti, valår, valtyp), sparade som .npy-filer som
+# kan minnesmappas av flera processer samtidigt.
+
+CUBE_PATH = Path('data/valkub')
+
+CUBE_VALUES = {'röster':'float64',
+               'procent':'float64',
+               'mandat':'float64'}
+
+
+def build_election_cube(elec_types=['K','L','R'],years=[2006,2010,2014,2018],
+                        path=CUBE_PATH,force=False):
+    """Bygger valkuben av all_elec_years() för valtyperna i \
+'elec_types'. Saknade värden (t.ex. ett parti som inte ställde upp) \
+blir NaN. Kuben byggs bara om när resultatfilerna har ändrats, om \
+inte force=True. Läs den med ElectionCube().
+
+PARAMETRAR
+----------
+elec_types : valtyperna, blir kubens fjärde axel
+years : valåren, blir kubens tredje axel
+path : mappen som kuben sparas i
+force : True bygger om kuben även om filerna är oförändrade"""
+    path = Path(path)
+    sources = [source for val in elec_types for source in store_sources(val)]
+    outputs = [path / f'{name}.npy' for name in list(CUBE_VALUES) + \
+               ['summa_mandat']] + [path / 'etiketter.json']
+
+    manifest = Manifest()
+    unit = f'election_cube:{path}'
+    if not force and manifest.is_current(unit, sources, outputs):
+        return ElectionCube(path)
+    fingerprint = manifest.fingerprint(sources)
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    df = pd.concat([all_elec_years(val).assign(valtyp=val) \
+                    for val in elec_types], ignore_index=True)
+    df = df.loc[df['valår'].isin(years)]
+
+    labels = {'kommun':sorted(df['kommun'].unique()),
+              'parti':sorted(df['parti'].unique()),
+              'valår':[int(year) for year in years],
+              'valtyp':list(elec_types)}
+
+    # radernas position längs varje axel
+    index = [pd.Categorical(df[axis], categories=labels[axis]).codes \
+             for axis in ['kommun','parti','valår','valtyp']]
+    shape = tuple(len(labels[axis]) for axis in labels)
+
+    for name, dtype in CUBE_VALUES.items():
+        cube = np.lib.format.open_memmap(path / f'{name}.npy', mode='w+',
+                                         dtype=dtype, shape=shape)
+        cube[:] = np.nan
+        cube[tuple(index)] = pd.to_numeric(df[name]).astype('float64')\
+                                .fillna(np.nan).to_numpy()
+        cube.flush()
+        del cube
+
+    summa = np.lib.format.open_memmap(path / 'summa_mandat.npy', mode='w+',
+                                      dtype='float64',
+                                      shape=(shape[0],shape[2],shape[3]))
+    summa[:] = np.nan
+    summa[index[0],index[2],index[3]] = \
+        pd.to_numeric(df['summa_mandat']).astype('float64').fillna(np.nan)\
+            .to_numpy()
+    summa.flush()
+    del summa
+
+    with open(path / 'etiketter.json', 'w', encoding='utf-8') as f:
+        json.dump(labels, f, ensure_ascii=False, indent=1)
+
+    manifest.record(unit, 'build_election_cube', sources, outputs, fingerprint)
+    manifest.save()
+    return ElectionCube(path)
+
+
+class ElectionCube:
+    """Läser valkuben från build_election_cube() minnesmappad. \
+Matriserna har axlarna (kommun, parti, valår, valtyp) och nås som \
+cube.röster, cube.procent och cube.mandat; cube.summa_mandat har \
+axlarna (kommun, valår, valtyp). Etiketterna för varje axel finns i \
+cube.labels och deras position i cube.index, t.ex. \
+cube.index['parti']['SD'].
+
+Skickas kuben till andra processer följer bara sökvägen med, och \
+varje process minnesmappar samma filer."""
+
+    axes = ['kommun','parti','valår','valtyp']
+
+    def __init__(self, path=CUBE_PATH):
+        self.path = Path(path)
+        with open(self.path / 'etiketter.json', encoding='utf-8') as f:
+            self.labels = json.load(f)
+        self.index = {axis:{label:i for i, label \
+                            in enumerate(self.labels[axis])} \
+                      for axis in self.axes}
+        for name in list(CUBE_VALUES) + ['summa_mandat']:
+            setattr(self, name, np.load(self.path / f'{name}.npy',
+                                        mmap_mode='r'))
+
+    def __getstate__(self):
+        return {'path':self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def positions(self, axis, labels):
+        """Positionerna för en eller flera etiketter längs en axel."""
+        if isinstance(labels, (list, tuple)):
+            return [self.index[axis][label] for label in labels]
+        return self.index[axis][labels]
+
+    def values(self, value='procent', elec_year=2018, elec_type='K'):
+        """En kommun × parti-matris för ett val."""
+        return getattr(self, value)[:,:,
+                                    self.positions('valår', elec_year),
+                                    self.positions('valtyp', elec_type)]
+
+    def frame(self, value='procent', elec_year=2018, elec_type='K'):
+        """values() som dataframe med kommunerna som index och \
+partierna som kolumner."""
+        return pd.DataFrame(np.asarray(self.values(value, elec_year,
+                                                   elec_type)),
+                            index=self.labels['kommun'],
+                            columns=self.labels['parti'])
+
+    def diff(self, value='procent', elec_year=2018, compare_year=2014,
+             elec_type='K'):
+        """Förändringen mellan två val, per kommun och parti."""
+        return self.values(value, elec_year, elec_type) - \
+               self.values(value, compare_year, elec_type)
+
+    def rank(self, value='procent', elec_year=2018, elec_type='K',
+             axis='kommun'):
+        """Rangordning (1 = störst) inom varje parti över kommunerna \
+(axis='kommun') eller inom varje kommun över partierna \
+(axis='parti'). Saknade värden får rang 0."""
+        values = np.asarray(self.values(value, elec_year, elec_type))
+        along = 0 if axis == 'kommun' else 1
+        order = np.argsort(-np.nan_to_num(values, nan=-np.inf), axis=along,
+                           kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order,
+                          np.arange(1, values.shape[along]+1)\
+                            .reshape((-1,1) if along == 0 else (1,-1)),
+                          axis=along)
+        ranks[np.isnan(values)] = 0
+        return ranks
+
+    def majority(self, parties, elec_year=2018, elec_type='K',
+                 value='mandat'):
+        """True för de kommuner där partierna i 'parties' \
+tillsammans har egen majoritet, i mandat (value='mandat') eller \
+i procent (value='procent')."""
+        values = self.values(value, elec_year, elec_type)
+        total = np.nansum(values[:,self.positions('parti', list(parties))],
+                          axis=1)
+        if value == 'procent':
+            return total > 50
+        summa = self.summa_mandat[:,self.positions('valår', elec_year),
+                                  self.positions('valtyp', elec_type)]
+        return total > summa/2
+
+
+def old_data_reshaper(df,year,elec_type,new_data=None):
     """Den här funktionen byter ut valdata hämtade från \
 alla grundfiler och byte ut dem med nästföljande vals \
 valdata, då från kolumnen "[variabel]_fgval" - där "variabel" \
-är mandat, procent och röster.
+är mandat, procent och röster. Nästföljande vals tabell kan ges \
+som 'new_data' om den redan är inläst, annars läses den från fil.
 """
-    path = Path(f'data/resultat/\
-resultat_{str(int(year)+4)}/valresultat_{str(int(year)+4)}{elec_type}.xlsx')
-    new_data = pd.read_excel(path).loc[:,['kommun',
-                                          'kommunkod',
-                                          'parti',
-                                          'mandat_fgval',
-                                          'procent_fgval',
-                                          'röster_fgval']]\
-                                .rename(columns={
-                                        'mandat_fgval':'mandat',
-                                        'procent_fgval':'procent',
-                                        'röster_fgval':'röster'})
+    if new_data is None:
+        path = Path(f'data/resultat/\
+resultat_{str(int(year)+4)}/valresultat_{str(int(year)+4)}{elec_type}.parquet')
+        new_data = load_table(path)
+    new_data = new_data.loc[:,['kommun',
+                               'kommunkod',
+                               'parti',
+                               'mandat_fgval',
+                               'procent_fgval',
+                               'röster_fgval']]\
+                        .rename(columns={
+                                'mandat_fgval':'mandat',
+                                'procent_fgval':'procent',
+                                'röster_fgval':'röster'})
     df = df.loc[:,['kommun','kommunkod','parti','mandat_fgval','procent_fgval','röster_fgval']]
     
     return df.merge(new_data,on=['kommun','kommunkod','parti'])
@@ -521,8 +1066,8 @@ def elec_macro_fetcher(elec_type='L',\
                        grouping='parti',\
                        pivot_value='procent',\
                        all_parties=False):
-    path_elec_results = Path('data/resultat/alla_valresultat_2006_2018.xlsx')
-    df = pd.read_excel(path_elec_results)
+    path_elec_results = Path('data/resultat/alla_valresultat_2006_2018.parquet')
+    df = load_table(path_elec_results)
     
     df = df.loc[df['parti']!='Övr']
 
@@ -556,10 +1101,57 @@ def fråga3_reformatter(df,party,year):
                             'procent':f'valresultat_{year}'})
     return df
 
+class PartyDeviations(Mapping):
+    """Resultatet av fråga_3(): partiernas avvikelse från riks-\
+resultatet i varje kommun. Fungerar som en dictionary {parti: df}, \
+men varje partis sorterade tabell skapas först när den efterfrågas, \
+och varje uppslag ger en egen kopia som kan ändras fritt.
+
+Alla avvikelser räknas ut på en gång som en kommun × parti-matris \
+(self.diff) med kommunernas resultat (self.values) minus riks-\
+resultatet (self.andelar)."""
+
+    def __init__(self, values, andelar, year, calc=True):
+        self.values = values
+        self.andelar = andelar
+        self.year = year
+        self.calc = calc
+        self.diff = pd.DataFrame(values.to_numpy() - \
+                                 andelar.to_numpy(dtype=values.to_numpy().dtype),
+                                 index=values.index,
+                                 columns=values.columns)
+        self.frames = {}
+
+    def __getitem__(self, party):
+        if party not in self.frames:
+            if party not in self.andelar.index:
+                raise KeyError(party)
+            diff = self.diff[party].sort_values(ascending=self.calc)
+            self.frames[party] = pd.DataFrame({
+                'kommun':diff.index,
+                'skillnad_jämf_riket':diff.to_numpy(),
+                'parti':party,
+                f'valresultat_{self.year}':self.values[party]\
+                                              .reindex(diff.index)\
+                                              .to_numpy(),
+                'andelar_riket':self.andelar[party]})
+        return self.frames[party].copy()
+
+    def __iter__(self):
+        return iter(self.andelar.index)
+
+    def __len__(self):
+        return len(self.andelar)
+
+
 def fråga_3(df,andelar_riket,year,calc=True):
-    
-    df = df.groupby(['kommun','parti'])\
-            .sum().reset_index()\
+    """Hur mycket varje parti i 'andelar_riket' avviker från sitt \
+riksresultat i varje kommun. Återger en PartyDeviations, som \
+används som en dictionary {parti: df} med kolumnerna kommun, \
+skillnad_jämf_riket, parti, valresultat_{år} och andelar_riket, \
+sorterad efter skillnaden (stigande om calc=True)."""
+    df = df.groupby(['kommun','parti'],observed=True)\
+            .sum(numeric_only=True).reset_index()\
             .loc[:,['kommun',
                     'parti',
                     'procent']]
@@ -567,24 +1159,11 @@ def fråga_3(df,andelar_riket,year,calc=True):
     df1 = df.pivot(index='kommun',
                   columns='parti',
                   values='procent')
-    a_dict = {}
-    for party in andelar_riket.parti:
-        value = andelar_riket.loc[andelar_riket['parti']==party,'andelar'].iloc[0]
-        
-        a_dict[party] = df1[party]-value
-        a_dict[party] = a_dict[party].sort_values(ascending=calc)
-        a_dict[party] = a_dict[party].reset_index()
-        a_dict[party]['parti'] = a_dict[party].columns[-1]
-        a_dict[party] = a_dict[party].merge(df.loc[:,['kommun',
-                                                       'parti',
-                                                       'procent']],
-                                             on=['kommun','parti'],
-                                             how='left')
-        a_dict[party]['andelar_riket'] = value
-        a_dict[party] = fråga3_reformatter(a_dict[party],party,year)
-    
-    
-    return a_dict
+
+    andelar = andelar_riket.drop_duplicates('parti')\
+                            .set_index('parti')['andelar']
+
+    return PartyDeviations(df1.loc[:,list(andelar.index)],andelar,year,calc)
 
 def fråga_4(df,sorter):
     a_dict = {}
@@ -629,6 +1208,128 @@ def fråga_5(df,year,year_compare,sorter=True,parties=['M',
                    inplace=True)
     return df
 
+# Cache för national_totals(), nyckeln är (valår, valtyp, partier) och
+# fingeravtrycken för riksfilen och valdeltagandefilen.
+
+_national_cache = {}
+
+RIKSDAGSPARTIER = ['M','C','L','KD','S','V','MP','SD','FI']
+
+
+NATIONAL_PATH = Path('data/resultat/alla_valresultat_2006_2018.parquet')
+
+
+def votes_path(year,elec_type):
+    """Valdeltagandefilen med det totala antalet röster för ett \
+val. För 2006 används _fgval-kolumnerna i 2010 års fil."""
+    if int(year) == 2006:
+        return Path(f'data/meta_filer/valdeltagande/\
+valdeltagande_2010{elec_type}.parquet')
+    return Path(f'data/meta_filer/valdeltagande/\
+valdeltagande_{year}{elec_type}.parquet')
+
+
+def national_totals(year,elec_type,parties=None):
+    """Valresultatet på riksnivå för ett val: röster och procent \
+per parti, där partier utanför 'parties' (default riksdagspartierna \
+och FI) slås ihop till 'Övr'. Procenten räknas på alla röster i \
+valdeltagandefilen.
+
+Resultatet räknas ut en gång per (valår, valtyp, partier) och \
+hämtas sedan ur en cache, så länge riksfilen och valdeltagande-\
+filen är oförändrade."""
+    parties = list(parties) if parties else RIKSDAGSPARTIER
+
+    path_votes = votes_path(year,elec_type)
+    key = (int(year), elec_type, tuple(parties),
+           file_fingerprint([NATIONAL_PATH, path_votes]))
+    if key not in _national_cache:
+        totalt = load_table(NATIONAL_PATH)
+
+        totalt = totalt.loc[totalt['val']==f'{year}{elec_type}',['parti','röster']]
+
+        totalt['parti'] = totalt['parti'].astype(object)\
+                            .where(totalt['parti'].isin(parties),'Övr')
+
+        totalt = totalt.groupby('parti').sum(numeric_only=True)
+
+        if int(year) == 2006:
+            sum_votes = load_table(path_votes).summa_röster_fgval.sum()
+        else:
+            sum_votes = load_table(path_votes).summa_röster.sum()
+
+        totalt['procent'] = ((totalt.röster/sum_votes)*100).round(1)
+
+        _national_cache[key] = totalt.loc[:,['procent','röster']].reset_index()
+    return _national_cache[key].copy()
+
+
+def national_results(elec_years=[2006,2010,2014,2018],elec_types=['K'],\
+                     parties=None,values=['procent','röster']):
+    """Valresultatet på riksnivå för flera val i en bred tabell, \
+med partierna som index och en kolumn per mått och val, t.ex. \
+'procent_2018K' och 'röster_2014L'. Partier som inte ställde upp \
+i ett val har NaN i det valets kolumner.
+
+Varje val hämtas ur cachen i national_totals(), så riksfilen och \
+valdeltagandefilerna läses bara när de har ändrats.
+
+PARAMETRAR
+----------
+elec_years : valåren
+elec_types : valtyperna, 'K', 'L' och/eller 'R'
+parties : partierna som inte slås ihop till 'Övr'
+values : måtten, 'procent' och/eller 'röster'"""
+    columns = {}
+    for elec_type in elec_types:
+        for year in elec_years:
+            totalt = national_totals(year,elec_type,parties).set_index('parti')
+            for value in values:
+                columns[f'{value}_{year}{elec_type}'] = \
+                    totalt[value].astype('float64')
+    return pd.concat(columns,axis=1).sort_index()
+
+
+def municipal_totals(df,year,parties=None):
+    """Samma tabell som national_totals(), men uträknad ur \
+kommunernas valresultat i 'df' (från all_elec_years())."""
+    parties = list(parties) if parties else RIKSDAGSPARTIER
+
+    df = df.loc[df['valår']==year]
+    sum_votes = df.loc[:,['kommun','summa_röster']].drop_duplicates()\
+                    .summa_röster.sum()
+
+    df = df.loc[~df['parti'].isin(['OG','OGEJ','BLANK'])]
+    totalt = df.loc[:,['parti','röster']]\
+                .assign(parti=df['parti'].astype(object)\
+                                .where(df['parti'].isin(parties), 'Övr'))\
+                .groupby('parti').sum(numeric_only=True)
+
+    totalt['procent']=((totalt.röster/sum_votes)*100).round(1)
+    return totalt.loc[:,['procent','röster']].reset_index()
+
+
+def check_totals(df,year,elec_type,parties=None,tolerance=0.1):
+    """Jämför riksresultatet i riksfilen (national_totals()) med \
+det som räknas fram ur kommunerna i 'df' (municipal_totals()). \
+Återger en tabell med båda och skillnaden per parti, och skriver \
+ut de partier vars procent skiljer mer än 'tolerance' procent-\
+enheter."""
+    check = national_totals(year,elec_type,parties)\
+                .merge(municipal_totals(df,year,parties),
+                       on='parti',
+                       how='outer',
+                       suffixes=('_riket','_kommuner'))
+    check['diff_procent'] = check.procent_riket - check.procent_kommuner
+    check['diff_röster'] = check.röster_riket - check.röster_kommuner
+
+    avvikande = check.loc[check.diff_procent.abs().fillna(float('inf'))>tolerance]
+    if len(avvikande):
+        print(f'Riksresultatet {year}{elec_type} stämmer inte med '
+              f'kommunernas summa för: {", ".join(avvikande.parti)}')
+    return check
+
+
 def valanalys(df,\
               query,\
               elec_type,\
@@ -638,7 +1339,8 @@ def valanalys(df,\
               mandates=None,\
               parties=None,\
               party=None,\
-              sorter=True):
+              sorter=True,\
+              check=False):
     """En multifunktionsfunktion. Används för Samuels jobb till valnumret. \
 
 PARAMETRAR
@@ -660,6 +1362,10 @@ sorter : behövs för query='jämför' - om ska listan sorteras stegrandes. \
 Default=True (sorterar stegrandes). Resultatet blir de 15 kommuner där \
 det gått sämst/bäst för partiet (som bestäms av 'party')
 
+check : för query='valresultat' - om True jämförs riksresultatet \
+med kommunernas summa i 'df', se check_totals(). Riksresultatet \
+hämtas annars ur cachen i national_totals().
+
 """
     if not parties:
         # parties ska ha som standard att vara riksdagspartierna
@@ -690,29 +1396,11 @@ det gått sämst/bäst för partiet (som bestäms av 'party')
         
         #totalt['röster'] = totalt['röster'].astype('int')
         
-        path_totalt = Path('data/resultat/alla_valresultat_2006_2018.xlsx')
-
-        totalt=pd.read_excel(path_totalt)
-        
-        totalt=totalt.loc[totalt['val']==f'{year}{elec_type}']
-
-        totalt.loc[~totalt['parti'].isin(parties),'parti'] = 'Övr'
-
-        totalt=totalt.loc[:,['parti','röster']].groupby('parti').sum()
-
-        if year == 2006:
-            path_votes_2010 = Path(f'data/meta_filer/valdeltagande/\
-valdeltagande_2010{elec_type}.xlsx')
-            sum_votes=pd.read_excel(path_votes_2010).summa_röster_fgval.sum()
-        else:
-            path_votes = Path(f'data/meta_filer/valdeltagande/\
-valdeltagande_{year}{elec_type}.xlsx')
-            sum_votes=pd.read_excel(path_votes).summa_röster.sum()
+        totalt = national_totals(year,elec_type,parties)
 
-        totalt['procent']=((totalt.röster/sum_votes)*100).round(1)
+        if check:
+            check_totals(df,year,elec_type,parties)
 
-        totalt=totalt.loc[:,['procent','röster']].reset_index()
-        
         df_test = totalt.loc[totalt['parti']!='Övr']
         
         df_test.rename(columns={f'procent':'andelar',
@@ -745,7 +1433,7 @@ valdeltagande_{year}{elec_type}.xlsx')
 
         df.loc[~df['parti'].isin(parties),'parti'] = 'övriga'
 
-        df=df.groupby(['kommun','parti']).sum().reset_index()
+        df=df.groupby(['kommun','parti'],observed=True).sum(numeric_only=True).reset_index()
 
         df=df.pivot(index='kommun',columns='parti',values='diff')
         
@@ -810,7 +1498,7 @@ def mandates_per_parti_in_total(df,elec_year=2018,compare_year=2014):
     
     df.loc[~df['parti'].isin(partier),'parti'] = 'Övr'
     
-    df = df.groupby(['valår','parti']).sum().reset_index()\
+    df = df.groupby(['valår','parti'],observed=True).sum(numeric_only=True).reset_index()\
             .loc[:,['valår',
                     'parti',
                     'mandat']]
@@ -858,19 +1546,11 @@ def vård_partier(df,pattern='vård',elec_year=2018,drop=True,acronyms=False):
     vårdpartier = ['SoL','SJPG','SJV','VåfP','dsp','SJVP','BA','Rf','SPVG']
     # Sjukvårdspartiet i Jönköpings län hittar vi inte förkortningen på
     
-    path_partierna = Path('data/resultat/alla_partier.xlsx')
-
-    partierna = pd.read_excel(path_partierna)
-    partierna = partierna.loc[partierna['val']==f'{str(elec_year)}L',
-                              ['parti','beteckning']]
-    
-    partierna.parti = partierna.parti.str.upper()
-    
     vårdpartier=[party.upper() for party in vårdpartier]
-    
+
     df = df.loc[df['valår']==elec_year]
-    
-    df = df.merge(partierna,on='parti',how='left')
+
+    df = party_registry().join(df,elec_year,'L',upper=True)
     
     if acronyms:
         return df.loc[df['parti'].isin(vårdpartier)]
@@ -881,25 +1561,15 @@ def vård_partier(df,pattern='vård',elec_year=2018,drop=True,acronyms=False):
         return df.loc[df.beteckning.fillna("").str.contains(pattern)]
     
     
-def three_elec_eval(df, elec_year=2018,elec_type='L',include_gotland=False):
-    if elec_type == 'L':
-        if not include_gotland:
-            df = df.loc[df['kommun']!='Gotland']
-    
-    
-    return valanalys(df,query='valresultat',year=elec_year,elec_type='L')[0]\
-        .rename(columns={'röster':f'röster_{str(elec_year)}',
-                         'andelar':f'andelar_{str(elec_year)}'})\
-        .merge(valanalys(df,query='valresultat',year=(elec_year-4),elec_type='L')[0],
-              on='parti',
-              how='left')\
-        .rename(columns={'röster':f'röster_{str(elec_year-4)}',
-                         'andelar':f'andelar_{str(elec_year-4)}'})\
-        .merge(valanalys(df,query='valresultat',year=(elec_year-8),elec_type='L')[0],
-              on='parti',
-              how='left')\
-        .rename(columns={'röster':f'röster_{str(elec_year-8)}',
-                         'andelar':f'andelar_{str(elec_year-8)}'})
+def three_elec_eval(elec_year=2018,elec_type='L'):
+    """Riksresultatet i valtypen 'elec_type' för 'elec_year' och \
+de två valen innan, med partierna i 'elec_year' som rader. \
+Resultatet hämtas ur riksfilen, se national_results()."""
+    years = [elec_year,elec_year-4,elec_year-8]
+    df = national_results(years,[elec_type])
+    df = df.loc[df[f'röster_{elec_year}{elec_type}'].notna()]
+    df.columns = [col[:-len(elec_type)] for col in df.columns]
+    return df.rename_axis('parti').reset_index()
 
 def muni_sorter(df,\
                 elec_year=2018,\
@@ -946,13 +1616,8 @@ partiförkortningar."""
         # sortera fram angivet partis alla kommuner under givna valåret
         df_muni = df.loc[(df['valår']==elec_year)&(df['parti']==party)]
     
-    # hämtar partibeteckningar
-    path_partierna = Path('data/resultat/alla_partier.xlsx')
-    partierna = pd.read_excel(path_partierna)
-    partierna = partierna.loc[partierna['val']==f'{str(elec_year)}K',
-                              ['parti','beteckning']]
-    
-    df_muni = df_muni.merge(partierna,on='parti',how='left')
+    # lägger till partibeteckningar
+    df_muni = party_registry().join(df_muni,elec_year,'K')
     
     df_muni = df_muni.sort_values(by='procent',ascending=False)
     
@@ -1004,15 +1669,8 @@ partiförkortningar."""
                                 ascending=sorter)
     
 def parti_till_grafik(df,elec_type,elec_year=2018,compare_year=2014,party='KD'):
-    grafik = valanalys(df,query='valresultat',year=elec_year,elec_type=elec_type)[0]\
-        .merge(valanalys(df,query='valresultat',year=compare_year,elec_type=elec_type)[0],
-              on='parti',how='left')
-
-    grafik.columns = ['parti',
-                      f'procent_{elec_year}{elec_type}',
-                      f'röster_{elec_year}{elec_type}',
-                      f'procent_{compare_year}{elec_type}',
-                      f'röster_{compare_year}{elec_type}']
+    grafik = national_results([elec_year,compare_year],[elec_type])\
+                .rename_axis('parti').reset_index()
 
     grafik = grafik.loc[grafik['parti']==party,['parti',
                                       f'procent_{elec_year}{elec_type}',
@@ -1027,67 +1685,73 @@ def parti_till_grafik(df,elec_type,elec_year=2018,compare_year=2014,party='KD'):
     grafik[f'{party}']=grafik[f'{party}'].round(1)
     return grafik
 
-def party_kommuner(df=all_elec_years('K'),elec_year=2018,sorter=False,party='KD'):
-    grafik=muni_sorter(df,
-                       elec_year=elec_year,
-                       party=party).sort_values(by=f'förändring_procent_{elec_year}_{elec_year-4}',
-                                               ascending=sorter).head(10)
-
-    förändring = [col for col in grafik.columns if 'förändring' in col]
-
-    grafik=grafik.loc[:,['kommun',f'procent_{elec_year-4}',f'procent_{elec_year}',förändring[0]]]
+def kommun_extremes(df,parties=['M','C','L','KD','S','V','MP','SD']):
+    """Det starkaste och det svagaste partiet i varje kommun och \
+valår i 'df'. Partier utanför 'parties' slås ihop till 'Övr', och \
+det svagaste partiet väljs bland partierna som har mandat.
+
+Procenten ställs upp som en (valår, kommun) × parti-matris och \
+partierna tas fram med argmax/argmin för alla kommuner på en gång. \
+Återger en tabell med (valår, kommun) som index och kolumnerna \
+starkast, starkast_procent, svagast och svagast_procent, där \
+partikolumnerna är kategoriska med kategorierna parties + ['Övr']."""
+    categories = list(parties) + ['Övr']
+
+    df = df.loc[~df['parti'].isin(['OG','OGEJ']),
+                ['valår','kommun','parti','procent','mandat']]
+    df = df.assign(parti=df['parti'].astype(object)\
+                            .where(df['parti'].isin(parties),'Övr'),
+                   procent_mandat=df['procent'].where(df['mandat'].notna()),
+                   har_mandat=df['mandat'].notna())
+
+    df = df.groupby(['valår','kommun','parti'],observed=True)\
+            .agg({'procent':'sum','procent_mandat':'sum','har_mandat':'any'})
+    matrix = lambda col: df[col].unstack('parti').reindex(columns=categories)
+    procent = matrix('procent')
+
+    matrices = {'starkast':procent.to_numpy(dtype='float64'),
+                'svagast':np.where(matrix('har_mandat').fillna(False).to_numpy(dtype=bool),
+                                   matrix('procent_mandat').to_numpy(dtype='float64'),
+                                   np.nan)}
+
+    extremes = pd.DataFrame(index=procent.index)
+    for col, values in matrices.items():
+        if col == 'starkast':
+            positions = np.argmax(np.where(np.isnan(values),-np.inf,values),axis=1)
+        else:
+            positions = np.argmin(np.where(np.isnan(values),np.inf,values),axis=1)
+        # kommuner utan värden (t.ex. utan mandat) får kod -1, dvs NaN
+        rows = np.arange(len(values))
+        positions = np.where(np.isnan(values).all(axis=1),-1,positions)
+        extremes[col] = pd.Categorical.from_codes(positions,categories)
+        extremes[f'{col}_procent'] = np.where(positions>=0,values[rows,positions],np.nan)
+    return extremes
 
-    grafik=grafik.rename(columns={f'procent_{elec_year}':f'Kommunvalet {elec_year}, %',
-                           förändring[0]:'Differens',
-                           f'procent_{elec_year-4}':f'Kommunvalet {elec_year-4}, %'})
-    
-    return grafik
 
 def weakest_strongest_party(df,elec_year=2018,max_min='max',party=None,overview=False):
-    
+    """Det starkaste (max_min='max') eller svagaste (max_min='min') \
+partiet i varje kommun 'elec_year', se kommun_extremes(). Återger \
+en tabell med kolumnerna kommun, parti och procent, eller med \
+overview=True antalet kommuner per parti."""
     max_min = max_min.lower()
-    
-    riksdagspartier = ['M','C','L','KD','S','V','MP','SD']
-    
-    df = df.loc[~df['parti'].isin(['OG','OGEJ'])]
-    
-    df.loc[~df['parti'].isin(riksdagspartier),'parti']='Övr'
-    
-    if max_min == 'min':
-        df = df.loc[~df['mandat'].isnull()]
-    
-    df = df.loc[df['valår']==elec_year]
-    
-    df1 = df.groupby(['kommun','parti']).sum()
-    
-    df1 = df1.sort_values(by='procent',ascending=False).sort_index(level=[0],sort_remaining=False)
-    
-    if max_min == 'max':
-        highest_values = df1.groupby(level=0)\
-                            .procent.max()\
-                            .reset_index(drop=True)
-        highest_values_party = df1.groupby(level=0).idxmax()\
-                                    .procent.apply(lambda x: x[-1])\
-                                    .reset_index()\
-                                    .rename(columns={'procent':'parti'})
-    
-    elif max_min == 'min':
-        highest_values = df1.groupby(level=0)\
-                            .procent.min()\
-                            .reset_index(drop=True)
-        highest_values_party = df1.groupby(level=0).idxmin()\
-                                    .procent.apply(lambda x: x[-1])\
-                                    .reset_index()\
-                                    .rename(columns={'procent':'parti'})
-    
-    df1 = pd.concat([highest_values_party,highest_values],axis=1)
-    if not overview:
-        if party:
-            return df1.loc[df1.parti==party]
-        else:
-            return df1
+    col = 'starkast' if max_min == 'max' else 'svagast'
+
+    extremes = kommun_extremes(df.loc[df['valår']==elec_year])
+    extremes = extremes.loc[extremes[col].notna()]
+
+    if overview:
+        counts = np.bincount(extremes[col].cat.codes,
+                             minlength=len(extremes[col].cat.categories))
+        counts = pd.Series(counts,index=extremes[col].cat.categories,name='parti')
+        return counts.loc[counts>0].sort_values(ascending=False,kind='stable')
+
+    df1 = pd.DataFrame({'kommun':extremes.index.get_level_values('kommun'),
+                        'parti':extremes[col].astype(object).to_numpy(),
+                        'procent':extremes[f'{col}_procent'].to_numpy()})
+    if party:
+        return df1.loc[df1.parti==party]
     else:
-        return df1.parti.value_counts()
+        return df1
 
 
 def riks_mot_kommun(df_riks,df_kommun,elec_year=2018,sorter=False):
@@ -1095,34 +1759,43 @@ def riks_mot_kommun(df_riks,df_kommun,elec_year=2018,sorter=False):
 gick svagast/starkast jämfört riksdagsvalets resultat i samma \
 kommun. Det är parametern sorter som bestämmer ifall man får \
 fram starkaste (sorter=False)/svagaste (sorter=True) kommunen \
-jämfört riksdagsvalet."""
-    a_list=[]
-    for party in ['M','L','C','KD','S','V','MP','SD']:
-        
-        riks = valanalys(df_riks,query='valresultat',year=elec_year,elec_type='R',sorter=sorter)[1][party]\
-            .loc[:,['kommun','parti',f'valresultat_{elec_year}']]\
-            .rename(columns={f'valresultat_{elec_year}':f'valresultat_{elec_year}R'})
+jämfört riksdagsvalet.
 
-        kommun = valanalys(df_kommun,query='valresultat',year=elec_year,elec_type='K',sorter=sorter)[1][party]\
-                   .loc[:,['kommun','parti',f'valresultat_{elec_year}']]\
-                   .rename(columns={f'valresultat_{elec_year}':f'valresultat_{elec_year}K'})
+Båda valens resultat ställs upp som kommun × parti-matriser (se \
+kommun_shares()) och differensen räknas för alla partier och \
+kommuner på en gång."""
+    parties = ['M','L','C','KD','S','V','MP','SD']
+
+    riks = kommun_shares(df_riks,elec_year,parties).reindex(columns=parties)
+    kommun = kommun_shares(df_kommun,elec_year,parties)\
+                .reindex(index=riks.index,columns=parties)
+
+    differens = kommun.to_numpy() - riks.to_numpy()
+
+    # saknade värden hamnar sist, som i sort_values()
+    if sorter:
+        rows = np.argmin(np.where(np.isnan(differens),np.inf,differens),axis=0)
+    else:
+        rows = np.argmax(np.where(np.isnan(differens),-np.inf,differens),axis=0)
+    columns = np.arange(len(parties))
+
+    return pd.DataFrame({'Parti':parties,
+                         'Kommun':riks.index[rows],
+                         'Riksdagsvalet, %':riks.to_numpy()[rows,columns].round(1),
+                         'Kommunvalet, %':kommun.to_numpy()[rows,columns].round(1),
+                         'Differens':differens[rows,columns]})
+
+
+def kommun_shares(df,elec_year,parties):
+    """Partiernas procent i varje kommun ett valår, som en \
+kommun × parti-matris. Kommunerna är alla som har något av \
+partierna i 'parties'."""
+    df = df.loc[(df['valår']==elec_year)&(df['parti'].isin(parties)),
+                ['kommun','parti','procent']]
+    df = df.assign(kommun=df['kommun'].astype(object),
+                   parti=df['parti'].astype(object))
+    return df.groupby(['kommun','parti']).procent.sum().unstack()
 
-        totalt = riks.merge(kommun,on=['kommun','parti'],how='left')
-        totalt['differens'] = totalt[f'valresultat_{elec_year}K']-totalt[f'valresultat_{elec_year}R']
-        totalt = totalt.sort_values('differens',ascending=sorter).head(1)
-        a_dict = {}
-        a_dict['Parti'] = totalt.parti.iloc[0]
-        a_dict['Kommun'] = totalt.kommun.iloc[0]
-        a_dict['Riksdagsvalet, %'] = totalt[f'valresultat_{elec_year}R'].iloc[0].round(1)
-        a_dict['Kommunvalet, %'] = totalt[f'valresultat_{elec_year}K'].iloc[0].round(1)
-        a_dict['Differens'] = totalt.differens.iloc[0]
-        a_list.append(a_dict)
-    return pd.DataFrame(a_list).loc[:,['Parti',
-                                       'Kommun',
-                                       'Riksdagsvalet, %',
-                                       'Kommunvalet, %',
-                                       'Differens']]
-    
 
 
 def party_mandate_counter(df,\
@@ -1177,7 +1850,11 @@ def party_mandate_counter(df,\
     else:
         return placeholder
     
-def party_kommuner(df=all_elec_years('K'),elec_year=2018,sorter=False,party='SD'):
+def party_kommuner(df=None,elec_year=2018,sorter=False,party='SD'):
+    """De tio kommuner där partiet ökat mest (sorter=False) eller \
+minst (sorter=True). Utan 'df' används all_elec_years('K')."""
+    if df is None:
+        df = all_elec_years('K')
     grafik=muni_sorter(df,
                        elec_year=elec_year,
                        party=party).sort_values(by=f'förändring_procent_{elec_year}_{elec_year-4}',
@@ -1219,7 +1896,7 @@ def majority_counter(df,years=[2006,2010,2014,2018],operator='procent',table=Fal
         
         df['valår'] = year
         
-        df = df.groupby(['valår']).sum()\
+        df = df.groupby(['valår'],observed=True).sum(numeric_only=True)\
                     .reset_index()\
                     .rename(columns={'parti':'antal_med_majoritetsparti'})
         
@@ -1252,7 +1929,7 @@ def majority_counter(df,years=[2006,2010,2014,2018],operator='procent',table=Fal
                                      'parti',
                                      'kommun']]\
                         .groupby(['valår',
-                                  'parti']).count()
+                                  'parti'],observed=True).count()
         
         return df.reset_index().pivot(index='valår',
                                       columns='parti',
@@ -1315,15 +1992,8 @@ def got_in_gov(val='K',\
             # sortera fram angivet partis alla kommuner under givna valåret
             df_muni = df.loc[(df['valår']==elec_year)&(df['parti']==party)]
 
-        # path conversion
-        path_partierna = Path('data/resultat/alla_partier.xlsx')
-
-        # hämtar partibeteckningar
-        partierna = pd.read_excel(path_partierna)
-        partierna = partierna.loc[partierna['val']==f'{str(elec_year)}K',
-                                  ['parti','beteckning']]
-
-        df_muni = df_muni.merge(partierna,on='parti',how='left')
+        # lägger till partibeteckningar
+        df_muni = party_registry().join(df_muni,elec_year,'K')
 
         df_muni = df_muni.sort_values(by='procent',ascending=False)
 
@@ -1404,45 +2074,26 @@ def representation_FI(df,elec_years=[2018],party='FI'):
 def totalprocent_jämförare(df,elec_year=2018,elec_type='K'):
     """En liten funktion som concatinerar andelarna för \
 det angivna valets resultat med valet innan. Använder \
-sig av funktionen valanalys()."""
+sig av funktionen national_results()."""
     
     compare_year = (elec_year-4)
-    
-    return pd.concat([valanalys(df,
-                                query='valresultat',
-                                year=elec_year,
-                                elec_type=elec_type)[0].rename(columns={
-                                    'procent':f'procent_{elec_year}',
-                                    'röster':f'röster_{elec_year}'
-                                    }),
-                        valanalys(df,
-                                  query='valresultat',
-                                  year=compare_year,
-                                  elec_type=elec_type)[0]\
-                           .loc[:,[f'procent',
-                                   f'röster']].rename(columns={
-                                    'procent':f'procent_{compare_year}',
-                                    'röster':f'röster_{compare_year}'
-                                    })],axis=1)\
-                .set_index('parti')
+
+    df = national_results([elec_year,compare_year],[elec_type])
+    df = df.loc[df[f'röster_{elec_year}{elec_type}'].notna()]
+    df.columns = [col[:-1] for col in df.columns]
+    return df.rename_axis('parti')
 
 def local_parties(df, elec_year=2018,elec_type='K',sorter=False,bort=['K', 'LPo', 'MED', 'SPI']):
     partier = ['M','C','L','KD','S','V','MP',
                'SD','FI','OG','OGEJ','BLANK']
     
-    path_beteckningar = Path('data/resultat/alla_partier.xlsx')
-    
-    beteckningar = pd.read_excel(path_beteckningar)
-    
-    beteckningar = beteckningar.loc[beteckningar['val']==f'{elec_year}{elec_type}']
-    beteckningar.parti=beteckningar.parti.str.upper()
     df.parti=df.parti.str.upper()
-    
+
     df = df.loc[(~df['parti'].isin(partier))&(df['valår']==elec_year)]
     df = df.loc[~df['parti'].isin([x.upper() for x in bort])]
     df = df.loc[df['mandat']>0]
-    
-    df = df.merge(beteckningar,on='parti',how='left')
+
+    df = party_registry().join(df,elec_year,elec_type,upper=True)
     
     return df.loc[:,['kommun','beteckning','procent','mandat','summa_mandat']]\
                 .rename(columns={'procent':f'procent_{elec_year}',
@@ -1466,9 +2117,9 @@ förändring) eller 'valdeltagande' (för att sortera efter vilken \
 kommun som hade högst/lägst valdeltagande i det angivna valet)."""
     
     path_participation = Path(f'data/meta_filer/valdeltagande/\
-valdeltagande_{elec_year}{elec_type}.xlsx')
+valdeltagande_{elec_year}{elec_type}.parquet')
     
-    df = pd.read_excel(path_participation)
+    df = load_table(path_participation)
     
     df[f'förändring_{compare_year}-{elec_year}'] = \
     df['valdeltagande'] - df['valdeltagande_fgval']
@@ -1495,14 +2146,14 @@ def elec_particip(elec_type='K'):
             summa_röstberättigade = "summa_röstberättigade_fgval"
                 
             path_2010 = Path(f'data/meta_filer/valdeltagande/\
-valdeltagande_2010{elec_type}.xlsx')
+valdeltagande_2010{elec_type}.parquet')
 
             # 2006 data finns i xml-filerna från 2010
-            df = pd.read_excel(path_2010)
+            df = load_table(path_2010)
         else:
             path = Path(f'data/meta_filer/valdeltagande/\
-valdeltagande_{year}{elec_type}.xlsx')
-            df = pd.read_excel(path)
+valdeltagande_{year}{elec_type}.parquet')
+            df = load_table(path)
             summa_röster = "summa_röster"
             summa_röstberättigade = "summa_röstberättigade"
         a_dict={}
@@ -1534,10 +2185,10 @@ och återger en df på dessa för det givna valåret ('elec_year'). \
 Default är Stockholm, Göteborg och Malmö."""
     
     path = Path(f'data/resultat/resultat_{elec_year}/\
-valresultat_{elec_year}{elec_type}.xlsx')
+valresultat_{elec_year}{elec_type}.parquet')
+
+    df = load_table(path)
 
-    df = pd.read_excel(path)
-    
     remove_these = ['OG',
                     'OGEJ',
                     'BLANK',
@@ -1548,17 +2199,10 @@ valresultat_{elec_year}{elec_type}.xlsx')
     
     compare_year = elec_year-4
     
-    path_descr = Path('data/resultat/alla_partier.xlsx')
-
-    beteckningar = pd.read_excel(path_descr)
-    
-    beteckningar = beteckningar.loc[beteckningar['val'] == \
-                                    f'{elec_year}{elec_type}']
-    
     df[f'{value}förändring_{compare_year}-{elec_year}'] = \
     df[f'{value}'] - df[f'{value}_fgval']
-    
-    df = df.merge(beteckningar,on='parti',how='left')
+
+    df = party_registry().join(df,elec_year,elec_type)
     
     return df.loc[:,['kommun',
                      'parti',
@@ -1609,13 +2253,8 @@ def looser_winner(df,\
         # sortera fram angivet partis alla kommuner under givna valåret
         df_muni = df.loc[(df['valår']==elec_year)&(df['parti']==party)]
     
-    # hämtar partibeteckningar
-    path_partierna = Path('data/resultat/alla_partier.xlsx')
-    partierna = pd.read_excel(path_partierna)
-    partierna = partierna.loc[partierna['val']==f'{str(elec_year)}K',
-                              ['parti','beteckning']]
-    
-    df_muni = df_muni.merge(partierna,on='parti',how='left')
+    # lägger till partibeteckningar
+    df_muni = party_registry().join(df_muni,elec_year,'K')
     
     df_muni = df_muni.sort_values(by='procent',ascending=False)
     
@@ -1703,25 +2342,12 @@ i kommunerna."""
     return df.sort_values(by='diff_K_jämf_R',ascending=False)
 
 def elec_compare(elec_types=['K','R'],elec_year=2018):
-    """Denna är det något vajsing med. Sket i den.."""
-    
-    return pd.concat([valanalys(all_elec_years(elec_types[0]),
-                                query='valresultat',
-                                year=elec_year,
-                                elec_type=elec_types[0])[0].rename(columns={
-                                    'procent':f'procent_{elec_year}{elec_types[0]}',
-                                    'röster':f'röster_{elec_year}{elec_types[0]}'
-                                    }),
-                        valanalys(all_elec_years(elec_types[-1]),
-                                  query='valresultat',
-                                  year=elec_year,
-                                  elec_type=elec_types[1])[0].rename(columns={
-                                    'procent':f'procent_{elec_year}{elec_types[1]}',
-                                    'röster':f'röster_{elec_year}{elec_types[1]}'
-                                    })\
-                           .loc[:,[f'procent_{elec_year}{elec_types[1]}',
-                                   f'röster_{elec_year}{elec_types[1]}']]],axis=1)\
-                .set_index('parti')
+    """Riksresultatet i två valtyper samma år, sida vid sida, \
+med partierna i den första valtypen som rader."""
+
+    df = national_results([elec_year],elec_types[:2])
+    df = df.loc[df[f'röster_{elec_year}{elec_types[0]}'].notna()]
+    return df.rename_axis('parti')
 
 def elec_macro_fetcher(elec_type='L',\
                        elec_years=[2010,
@@ -1740,10 +2366,10 @@ def elec_macro_fetcher(elec_type='L',\
                        pivot_value='procent',\
                        all_parties=False):
     
-    path = Path('data/resultat/alla_valresultat_2006_2018.xlsx')
+    path = Path('data/resultat/alla_valresultat_2006_2018.parquet')
+
+    df = load_table(path)
 
-    df = pd.read_excel(path)
-    
     elec_years = [str(year)+elec_type for year in elec_years]
     
     if not all_parties:
@@ -1756,7 +2382,7 @@ def elec_macro_fetcher(elec_type='L',\
     df = df.loc[df['val'].isin(elec_years)]
     
 
-    df = df.groupby([f'{grouping}','val']).sum().reset_index()
+    df = df.groupby([f'{grouping}','val'],observed=True).sum(numeric_only=True).reset_index()
 
 
     
@@ -1809,4 +2435,182 @@ def till_datawrapper(elec_types=['K','R'],\
 
 
 
-    
\ No newline at end of file
+    
+
+
+# Sessioner: en ElectionSession läser varje källa en gång och
+# delar ut kopior till alla funktioner som körs inom den.
+
+_sessions = []
+
+
+def active_session():
+    """Den ElectionSession som är aktiv just nu, eller None."""
+    return _sessions[-1] if _sessions else None
+
+
+def load_table(path):
+    """Läser en tabell med read_table(), eller från den aktiva \
+sessionen om en sådan finns. Används av alla funktioner i util \
+som läser filer."""
+    session = active_session()
+    if session is not None:
+        return session.read(path)
+    return read_table(path)
+
+
+class ElectionSession:
+    """Håller all data som funktionerna i util behöver i minnet: \
+valresultaten för K, L och R (all_elec_years()), valdeltagandet, \
+partibeteckningarna, riksresultaten och styrena. Varje källa läses \
+från disk en gång per session.
+
+Analysfunktionerna i SESSION_FUNCTIONS kan anropas som metoder på \
+sessionen, t.ex. session.valanalys(query='valresultat', \
+elec_type='K'). Tabeller som inte anges (t.ex. 'df') fylls i från \
+den källa som SESSION_FUNCTIONS anger för funktionen. Alla \
+funktioner kan också köras som vanligt inom ett with-block:
+
+    with ElectionSession() as session:
+        valanalys(session.all_elec_years('K'), query='valresultat')
+
+PARAMETRAR
+----------
+elec_types : valtyperna som läses in
+preload : True läser in alla källor direkt, annars läses varje \
+källa första gången den används"""
+
+    def __init__(self, elec_types=['K','L','R'], preload=True):
+        self.elec_types = list(elec_types)
+        self.tables = {}
+        self.elec_years = {}
+        if preload:
+            self.load()
+
+    def sources(self):
+        """Alla filer som sessionen läser in i förväg."""
+        paths = [Path('data/styren_2006_2014_formatted.xlsx'),
+                 Path('data/resultat/alla_valresultat_2006_2018.parquet')]
+        for val in self.elec_types:
+            paths += store_sources(val)
+        return paths
+
+    def load(self):
+        """Läser in alla källor som finns på disk."""
+        for path in self.sources():
+            if path.exists() or path.with_suffix('.xlsx').exists():
+                self.read(path)
+        party_registry()
+        for val in self.elec_types:
+            self.all_elec_years(val)
+        return self
+
+    def read(self, path):
+        """En kopia av tabellen i 'path', som läses från disk \
+första gången."""
+        key = str(path)
+        if key not in self.tables:
+            self.tables[key] = read_table(path)
+        return self.tables[key].copy()
+
+    def all_elec_years(self, val, exclude=True, report=False):
+        """En kopia av all_elec_years(val, exclude)."""
+        key = (val, exclude)
+        if key not in self.elec_years:
+            with self:
+                self.elec_years[key] = _load_elec_years(val,exclude,report)
+        elif report:
+            memory_report(self.elec_years[key])
+        return self.elec_years[key].copy()
+
+    def __enter__(self):
+        _sessions.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _sessions.remove(self)
+
+    def __getattr__(self, name):
+        if name not in SESSION_FUNCTIONS:
+            raise AttributeError(name)
+
+        func = globals()[name]
+        tables = SESSION_FUNCTIONS[name]
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def method(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs)
+            bound.apply_defaults()
+            with self:
+                for param, source in tables.items():
+                    if bound.arguments.get(param) is None:
+                        bound.arguments[param] = source(self, bound.arguments)
+                return func(*bound.args, **bound.kwargs)
+        return method
+
+
+# Källorna för tabellerna som ElectionSession fyller i. Varje källa
+# tar sessionen och funktionens argument och återger en tabell.
+
+def _elec_years_source(val=None):
+    """Källa för all_elec_years(): för valtypen 'val', annars \
+funktionens 'elec_type' (default 'K')."""
+    def source(session, arguments):
+        return session.all_elec_years(val or arguments.get('elec_type') or 'K')
+    return source
+
+
+def _govs_source(session, arguments):
+    """Källa för block_gov_count(): styrena mandatperioden som \
+börjar 'compare_year'."""
+    return gov_mandates(int(arguments['compare_year']))
+
+
+def _big_city_source(session, arguments):
+    """Källa för storstäderna_grafik(): big_city_sort() för 'stad'."""
+    return big_city_sort(cities=[arguments['stad']],
+                         elec_year=arguments['elec_year'])
+
+
+# Analysfunktionerna som kan anropas som metoder på en ElectionSession,
+# med parametrarna som sessionen fyller i och deras källor.
+
+SESSION_FUNCTIONS = {
+    'valanalys':{'df':_elec_years_source()},
+    'municipal_totals':{'df':_elec_years_source()},
+    'check_totals':{'df':_elec_years_source()},
+    'majority_calc':{'df':_elec_years_source()},
+    'bästa_kommunen':{'df':_elec_years_source()},
+    'mandates_per_parti_in_total':{'df':_elec_years_source()},
+    'strongest_region':{'df':_elec_years_source()},
+    'vård_partier':{'df':_elec_years_source()},
+    'muni_sorter':{'df':_elec_years_source()},
+    'parti_till_grafik':{'df':_elec_years_source()},
+    'kommun_extremes':{'df':_elec_years_source()},
+    'weakest_strongest_party':{'df':_elec_years_source()},
+    'party_mandate_counter':{'df':_elec_years_source()},
+    'party_kommuner':{'df':_elec_years_source()},
+    'majority_counter':{'df':_elec_years_source()},
+    'representation_FI':{'df':_elec_years_source()},
+    'totalprocent_jämförare':{'df':_elec_years_source()},
+    'local_parties':{'df':_elec_years_source()},
+    'looser_winner':{'df':_elec_years_source()},
+    'riks_mot_kommun':{'df_riks':_elec_years_source('R'),
+                       'df_kommun':_elec_years_source('K')},
+    'block_gov_count':{'df':_govs_source},
+    'storstäderna_grafik':{'df':_big_city_source},
+    'gov_mandates':{},
+    'national_results':{},
+    'national_totals':{},
+    'three_elec_eval':{},
+    'elec_compare':{},
+    'got_in_gov':{},
+    'particip_sorter':{},
+    'elec_particip':{},
+    'kommun_deltagande':{},
+    'big_city_sort':{},
+    'local_magnates':{},
+    'elec_macro_fetcher':{},
+    'till_datawrapper':{},
+}